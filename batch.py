@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+#Tesseract's OpenMP threads are limited to one per worker before ocr imports tesserocr, since OpenMP reads these settings once when tesserocr loads it. They are inherited by the workers and by the tesseract processes they spawn
+os.environ["OMP_THREAD_LIMIT"] = "1"
+os.environ["OMP_NUM_THREADS"] = "1"
+
+import cv2
+
+import ocr
+import sinks
+import instrumentation
+import ingestion
+import extraction
+
+#Prepares a pool worker. Tesseract (through OpenMP) and OpenCV both start their own thread pools, which oversubscribes the cores when several drawings are processed at once, so each worker is pinned to 1 thread
+def initWorker(ocrBackend = "auto"):
+    ocr.setBackend(ocrBackend) #each worker keeps its own warm OCR engine for the lifetime of the pool
+    cv2.setNumThreads(1)
+
+#Runs the extraction of a single drawing inside a worker, so that any unexpected error is reported as a failed result instead of stopping the whole batch. The drawing is profiled when profileSlow is set
+def runDrawing(job):
+    filename, page, directory, options, profileSlow, profileDirectory = job
+    startTime = time.perf_counter()
+
+    try:
+        result = instrumentation.profiled(ingestion.pageName(filename, page), profileSlow, profileDirectory, extraction.processDrawing, filename, directory, page = page, **options)
+
+    except Exception as error:
+        result = {"filename": ingestion.pageName(filename, page), "success": False, "error": repr(error), "failure": "exception"}
+
+    result["seconds"] = time.perf_counter() - startTime
+    return result
+
+#Spreads the drawings across a pool of worker processes and collects the success/failure result of every drawing (each page of a multi-page file is a separate drawing). Any options (e.g. ocrMode, useCache) are parsed to processDrawing.
+#When a sink is parsed, the workers return the table rows and this process hands them to the sink, whose background thread writes them while the workers carry on.
+#When a recorder is parsed, the result of every drawing is recorded as it's collected, and drawings taking at least profileSlow seconds are profiled (see instrumentation.profiled)
+def runBatch(filenames, directory = extraction.drawingsDirectory, workers = None, ocrBackend = "auto", sink = None, recorder = None, profileSlow = None, profileDirectory = instrumentation.profileDirectory, **options):
+    workers = workers or os.cpu_count()
+    options["returnRows"] = sink is not None
+    jobs = ((filename, page, directory, options, profileSlow, profileDirectory) for filename, page in ingestion.listPages(filenames, directory)) #a job per page, each worker only decodes its own page
+    results = []
+
+    startTime = time.perf_counter()
+
+    with Pool(processes = workers, initializer = initWorker, initargs = (ocrBackend,)) as pool:
+        for result in pool.imap_unordered(runDrawing, jobs): #results are collected as soon as each drawing is finished
+            if "rows" in result:
+                sink.write(result["filename"], result.pop("rows"))
+
+            if recorder is not None:
+                recorder.record(result)
+
+            results.append(result)
+
+    elapsedTime = time.perf_counter() - startTime
+    results.sort(key = lambda result: result["filename"])
+
+    return results, elapsedTime
+
+#Runs the batch with both OCR modes and reports the OCR time saved by region-restricted OCR compared with the two-pass (page and table) flow.
+#The other extraction options (see extraction.extractionOptions) are the same for both runs
+def compareOcrModes(filenames, directory = extraction.drawingsDirectory, workers = None, ocrBackend = "auto", **options):
+    ocrSeconds = {}
+
+    for ocrMode in extraction.ocrModes:
+        results, elapsedTime = runBatch(filenames, directory, workers, ocrBackend, ocrMode = ocrMode, **options)
+        ocrSeconds[ocrMode] = sum(result.get("ocrSeconds", 0.0) for result in results)
+        print(ocrMode + " OCR: " + format(ocrSeconds[ocrMode], ".2f") + "s of OCR, " + format(elapsedTime, ".2f") + "s in total, " + str(sum(not result["success"] for result in results)) + " failed")
+
+    savedSeconds = ocrSeconds["page"] - ocrSeconds["region"]
+    print("Region OCR saved " + format(savedSeconds, ".2f") + "s (" + format(100 * savedSeconds / max(ocrSeconds["page"], 1e-9), ".1f") + "% of the OCR time, " + format(savedSeconds / max(len(results), 1), ".3f") + "s per drawing).")
+
+    return ocrSeconds
+
+#Runs the batch with a single full resolution OCR pass and with progressive OCR, and reports how many table words were escalated and the OCR time saved by progressive OCR.
+#The other extraction options (see extraction.extractionOptions) are the same for both runs
+def compareProgressiveOcr(filenames, directory = extraction.drawingsDirectory, workers = None, ocrBackend = "auto", ocrMode = "page", **options):
+    ocrSeconds = {}
+
+    for progressiveOcr in (False, True):
+        results, elapsedTime = runBatch(filenames, directory, workers, ocrBackend, ocrMode = ocrMode, **dict(options, progressiveOcr = progressiveOcr))
+        ocrSeconds[progressiveOcr] = sum(result.get("ocrSeconds", 0.0) for result in results)
+        print(("Progressive" if progressiveOcr else "Single pass") + " OCR: " + format(ocrSeconds[progressiveOcr], ".2f") + "s of OCR, " + format(elapsedTime, ".2f") + "s in total, " + str(sum(not result["success"] for result in results)) + " failed")
+
+    counts = [result.get("counts", {}) for result in results]
+    print("Escalated " + str(sum(count.get("escalatedWords", 0) for count in counts)) + " of " + str(sum(count.get("tableWords", 0) for count in counts)) + " table words to full resolution, and checked " + str(sum(count.get("escalatedRegions", 0) for count in counts)) + " unselected table regions at full resolution.")
+
+    savedSeconds = ocrSeconds[False] - ocrSeconds[True]
+    print("Progressive OCR saved " + format(savedSeconds, ".2f") + "s (" + format(100 * savedSeconds / max(ocrSeconds[False], 1e-9), ".1f") + "% of the OCR time, " + format(savedSeconds / max(len(results), 1), ".3f") + "s per drawing).")
+
+    return ocrSeconds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Extracts a directory of engineering drawings across a pool of worker processes.")
+    parser.add_argument("directory", nargs = "?", default = extraction.drawingsDirectory, help = "directory containing the engineering drawing images")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (defaults to the number of cores)")
+    parser.add_argument("--ocr-backend", default = ocr.backend, choices = ["auto", "tesserocr", "pytesseract"], help = "OCR backend, 'auto' uses tesserocr when installed and pytesseract otherwise")
+    parser.add_argument("--ocr-mode", default = "page", choices = extraction.ocrModes, help = "'page' OCRs the whole sheet and then the table, 'region' only OCRs the candidate table regions")
+    parser.add_argument("--compare-ocr-modes", action = "store_true", help = "runs the batch with both OCR modes and reports the time saved by region OCR")
+    parser.add_argument("--compare-progressive-ocr", action = "store_true", help = "runs the batch with a single OCR pass and with progressive OCR, and reports the escalated words and the time saved")
+    extraction.addExtractionArguments(parser)
+    extraction.addRunArguments(parser)
+    parser.add_argument("-r", "--report", default = None, help = "optional path of a JSON file to save the per-file results to")
+    args = parser.parse_args()
+
+    options = extraction.extractionOptions(args)
+
+    extraction.createResultDirectories()
+    filenames = ingestion.listImages(args.directory) #the pages of multi-page files are processed separately
+
+    if args.compare_ocr_modes:
+        compareOcrModes(filenames, args.directory, args.workers, args.ocr_backend, **options)
+        sys.exit(0)
+
+    if args.compare_progressive_ocr:
+        compareProgressiveOcr(filenames, args.directory, args.workers, args.ocr_backend, args.ocr_mode, **options)
+        sys.exit(0)
+
+    sink = sinks.openSink(args.output, args.output_path) #None when saving a spreadsheet per drawing
+    recorder = instrumentation.openRecorder(args.metrics, args.metrics_format) #None when instrumentation is disabled
+
+    try:
+        results, elapsedTime = runBatch(filenames, args.directory, args.workers, args.ocr_backend, sink, recorder, args.profile_slow, args.profile_directory, ocrMode = args.ocr_mode, useCache = args.cache, **options)
+
+    finally:
+        if sink is not None:
+            sink.close()
+
+        if recorder is not None:
+            recorder.close()
+
+    failures = [result for result in results if not result["success"]]
+
+    extraction.evictCache(args)
+
+    for result in failures:
+        print("FAILED: " + result["filename"] + " - " + str(result["error"]))
+
+    print("Processed " + str(len(results)) + " drawings (" + str(len(failures)) + " failed) in " + format(elapsedTime, ".2f") + "s, " + format(len(results) / max(elapsedTime, 1e-9), ".2f") + " drawings/s.")
+
+    if args.report:
+        with open(args.report, "w") as reportFile:
+            json.dump({"seconds": elapsedTime, "workers": args.workers or os.cpu_count(), "results": results}, reportFile, indent = 2)
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import cv2
+
+import ocr
+import extraction
+import ingestion
+
+goldenDirectory = "Golden Outputs" #expected outputs of the sample drawings, one JSON file per drawing created with --update-golden on a machine with Tesseract installed
+
+#Previous implementation of the table mask, testing every word against every contour with pointPolygonTest. Kept as the reference the label image lookup is compared against
+def pointPolygonTestMask(contours, lefts, tops, shape):
+    nrow, ncol = shape
+    finalMask = np.zeros((nrow, ncol), dtype=np.uint8)
+
+    for c in contours:
+        if cv2.contourArea(c) < nrow * ncol * 0.5:
+            for left, top in zip(lefts, tops):
+                if cv2.pointPolygonTest(c, (int(left), int(top)), False) >= 0:
+                    cv2.drawContours(finalMask, [c], -1, 255, -1)
+                    break
+
+    return finalMask
+
+#returns the word coordinates used to build the table mask, either recognised with OCR or randomly generated (half across the page and half inside the candidate regions) when syntheticWords is set
+def wordCoordinates(imgThreshInv, canny_contours, syntheticWords = 0, seed = 0):
+    if not syntheticWords:
+        imageData = ocr.imageToData(imgThreshInv, extraction.OCR_config)
+        words = [i for i in range(len(imageData['text'])) if extraction.isPageWord(imageData, i)]
+        return [imageData['left'][i] for i in words], [imageData['top'][i] for i in words]
+
+    nrow, ncol = imgThreshInv.shape
+    generator = np.random.default_rng(seed)
+    lefts = list(generator.integers(0, ncol, syntheticWords // 2))
+    tops = list(generator.integers(0, nrow, syntheticWords // 2))
+
+    for c in generator.choice(len(canny_contours), syntheticWords - syntheticWords // 2) if canny_contours else []:
+        x, y, w, h = cv2.boundingRect(canny_contours[c])
+        lefts.append(generator.integers(x, x + w))
+        tops.append(generator.integers(y, y + h))
+
+    return lefts, tops
+
+#Benchmarks the label image lookup of the table mask against the pointPolygonTest loop on each drawing, and checks the masks are pixel-identical
+def benchmarkTableMask(filenames, directory = extraction.drawingsDirectory, syntheticWords = 0, repeats = 3):
+    rows = []
+
+    for filename in filenames:
+        imgGrayscale = cv2.imread(os.path.join(directory, filename), cv2.IMREAD_GRAYSCALE)
+        imgThreshInv = cv2.adaptiveThreshold(imgGrayscale, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, extraction.thresholdBlockSize, extraction.thresholdConstant)
+        contours, contourAreas, canny_contours, cannyContourAreas = extraction.detectContours(imgThreshInv)
+        lefts, tops = wordCoordinates(imgThreshInv, canny_contours, syntheticWords)
+
+        loopSeconds = labelSeconds = float("inf")
+
+        for i in range(repeats): #best of the repeats, to reduce the noise of other processes
+            startTime = time.perf_counter()
+            loopMask = pointPolygonTestMask(canny_contours, lefts, tops, imgGrayscale.shape)
+            loopSeconds = min(loopSeconds, time.perf_counter() - startTime)
+
+            startTime = time.perf_counter()
+            labelMask = extraction.textContourMask(canny_contours, cannyContourAreas, lefts, tops, imgGrayscale.shape)
+            labelSeconds = min(labelSeconds, time.perf_counter() - startTime)
+
+        rows.append({"filename": filename, "contours": len(canny_contours), "words": len(lefts), "loopSeconds": loopSeconds, "labelSeconds": labelSeconds, "identical": bool(np.array_equal(loopMask, labelMask))})
+        print(filename + ": " + str(len(canny_contours)) + " contours x " + str(len(lefts)) + " words, loop " + format(loopSeconds * 1000, ".2f") + "ms, label image " + format(labelSeconds * 1000, ".2f") + "ms, " + ("identical" if rows[-1]["identical"] else "DIFFERENT"))
+
+    return rows
+
+#returns the grayscale drawing, upscaled by the parsed factor to simulate large-format scans
+def readDrawing(filename, directory = extraction.drawingsDirectory, scale = 1):
+    imgGrayscale = cv2.imread(os.path.join(directory, filename), cv2.IMREAD_GRAYSCALE)
+
+    if scale != 1:
+        imgGrayscale = cv2.resize(imgGrayscale, None, fx = scale, fy = scale, interpolation = cv2.INTER_CUBIC)
+
+    return imgGrayscale
+
+#returns the result of the function with the time it took and the peak memory allocated for images (NumPy arrays) while it ran
+def measure(function, *args):
+    tracemalloc.start()
+    startTime = time.perf_counter()
+
+    try:
+        value = function(*args)
+        seconds = time.perf_counter() - startTime
+        peakBytes = tracemalloc.get_traced_memory()[1]
+
+    finally:
+        tracemalloc.stop()
+
+    return value, seconds, peakBytes
+
+#Benchmarks the low-memory mode against the full-frame path of Part 1 and the table OCR on each drawing, and checks that the cropped drawing and table words are the same
+def benchmarkLowMemory(filenames, directory = extraction.drawingsDirectory, ocrMode = "page", memoryBudget = extraction.tiling.tileMemoryBudget, scale = 1):
+    rows = []
+
+    for filename in filenames:
+        imgGrayscale = readDrawing(filename, directory, scale)
+
+        (fullDrawing, fullTableData), fullSeconds, fullPeak = measure(extraction.extractDrawingAndTable, imgGrayscale.copy(), ocrMode, {"ocrSeconds": 0.0})
+        (lowDrawing, lowTableData), lowSeconds, lowPeak = measure(extraction.extractDrawingAndTable, imgGrayscale.copy(), ocrMode, {"ocrSeconds": 0.0}, True, memoryBudget)
+
+        identical = fullDrawing.shape == lowDrawing.shape and bool(np.array_equal(fullDrawing, lowDrawing)) and fullTableData == lowTableData
+        rows.append({"filename": filename, "shape": list(imgGrayscale.shape), "fullSeconds": fullSeconds, "lowSeconds": lowSeconds, "fullPeakBytes": fullPeak, "lowPeakBytes": lowPeak, "identical": identical})
+        print(filename + " " + str(imgGrayscale.shape[1]) + "x" + str(imgGrayscale.shape[0]) + ": full-frame " + format(fullPeak / 2**20, ".0f") + "MB in " + format(fullSeconds, ".2f") + "s, low-memory " + format(lowPeak / 2**20, ".0f") + "MB in " + format(lowSeconds, ".2f") + "s, " + ("identical" if identical else "DIFFERENT"))
+
+    return rows
+
+#returns the peak resident memory of this process so far, in bytes
+def peakRssBytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 #reported in kilobytes on Linux
+
+#returns the path of the golden output of a drawing
+def goldenPath(filename, directory = goldenDirectory):
+    return os.path.join(directory, os.path.splitext(filename)[0] + ".json")
+
+#Compares the extracted table rows and drawing bounding box of a drawing with its golden output. Rows are compared as a multiset, so a moved row counts as matched but a changed row doesn't.
+#The golden output's Tesseract version is compared with tesseractVersion too, as another version may recognise the words differently
+def compareGolden(row, golden, boxTolerance = 0, tesseractVersion = None):
+    fields = [tuple(cells) for cells in row["fields"] or []]
+    goldenFields = [tuple(cells) for cells in golden["fields"] or []]
+    boxMatches = (row["drawingBox"] is None) == (golden["drawingBox"] is None) and (row["drawingBox"] is None or max(abs(a - b) for a, b in zip(row["drawingBox"], golden["drawingBox"])) <= boxTolerance)
+
+    return {
+        "fieldsExpected": len(goldenFields),
+        "fieldsExtracted": len(fields),
+        "fieldsMatched": sum((Counter(fields) & Counter(goldenFields)).values()),
+        "boxMatches": boxMatches,
+        "identical": boxMatches and fields == goldenFields and row["success"] == golden["success"],
+        "versionMatches": golden.get("tesseractVersion") == tesseractVersion,
+    }
+
+#Benchmarks the whole pipeline (in memory with extraction.extract, then exported to a temporary directory) on each drawing, recording the time of each stage.
+#At scale 1, the outputs are compared with the golden outputs in goldenDirectory (a drawing without a golden output is marked as missing), or saved as the new golden outputs when updateGolden is set. With progressiveOcr, the numbers of escalated table words and regions are recorded as well.
+#With useTemplates, the drawings are extracted with the layout templates in templateDirectory, learning the templates of the others
+def benchmarkPipeline(filenames, directory = extraction.drawingsDirectory, ocrMode = "page", scale = 1, lowMemory = False, memoryBudget = extraction.tiling.tileMemoryBudget, titleLists = extraction.drawingTitles, goldenDirectory = goldenDirectory, updateGolden = False, boxTolerance = 0, progressiveOcr = False, useTemplates = False, templateDirectory = extraction.templates.templateDirectory):
+    rows = []
+    tesseractVersion = ocr.tesseractVersion() if scale == 1 else None
+
+    if updateGolden:
+        os.makedirs(goldenDirectory, exist_ok = True)
+
+    with tempfile.TemporaryDirectory() as exportDirectory:
+        for filename in filenames:
+            imgGrayscale = readDrawing(filename, directory, scale)
+            startTime = time.perf_counter()
+
+            result = extraction.extract(imgGrayscale, ocrMode, titleLists, lowMemory, memoryBudget, useTemplates, templateDirectory, progressiveOcr)
+            exportStartTime = time.perf_counter()
+
+            if result["drawing"] is not None:
+                cv2.imwrite(os.path.join(exportDirectory, os.path.splitext(filename)[0] + "_drawing.png"), result["drawing"])
+
+            if result["success"]:
+                extraction.saveTableValues(result["fields"], filename, exportDirectory)
+
+            extraction.timeStage(result, "export", exportStartTime)
+
+            row = {"filename": filename, "shape": list(imgGrayscale.shape), "seconds": time.perf_counter() - startTime, "stageSeconds": result["stageSeconds"], "ocrSeconds": result["ocrSeconds"], "counts": result.get("counts", {}),
+                   "success": result["success"], "error": result["error"], "fields": result["fields"], "drawingBox": result.get("drawingBox"), "template": result.get("template"), "golden": None, "goldenMissing": False}
+
+            if updateGolden and scale == 1:
+                with open(goldenPath(filename, goldenDirectory), "w", encoding = "utf-8") as goldenFile:
+                    json.dump({"filename": filename, "ocrMode": ocrMode, "tesseractVersion": tesseractVersion, "success": row["success"], "fields": row["fields"], "drawingBox": row["drawingBox"]}, goldenFile, indent = 4)
+
+            elif scale == 1 and os.path.exists(goldenPath(filename, goldenDirectory)):
+                with open(goldenPath(filename, goldenDirectory), encoding = "utf-8") as goldenFile:
+                    row["golden"] = compareGolden(row, json.load(goldenFile), boxTolerance, tesseractVersion)
+
+            elif scale == 1: #a drawing without a golden output can't be checked, so it fails the regression check
+                row["goldenMissing"] = True
+
+            rows.append(row)
+            golden = ("MISSING golden output" if row["goldenMissing"] else "no golden output") if row["golden"] is None else ("matches golden output" if row["golden"]["identical"] else "DIFFERENT from golden output (" + str(row["golden"]["fieldsMatched"]) + "/" + str(row["golden"]["fieldsExpected"]) + " rows)")
+            print(filename + " " + str(imgGrayscale.shape[1]) + "x" + str(imgGrayscale.shape[0]) + ": " + format(row["seconds"], ".2f") + "s (OCR " + format(row["ocrSeconds"], ".2f") + "s), " + ("extracted" if row["success"] else "FAILED") + ", " + golden)
+
+    return rows
+
+#Checks that the layout templates give the same outputs as the full pipeline: the drawings are extracted by the full pipeline, then twice with layout templates learned into a temporary directory (the first pass learns them).
+#The rows and drawing bounding box of every drawing extracted with a template are compared with the full pipeline's
+def benchmarkTemplates(filenames, directory = extraction.drawingsDirectory, ocrMode = "page", titleLists = extraction.drawingTitles, progressiveOcr = False):
+    rows = []
+    fullResults = {}
+
+    for filename in filenames:
+        startTime = time.perf_counter()
+        result = extraction.extract(readDrawing(filename, directory), ocrMode, titleLists, progressiveOcr = progressiveOcr)
+        fullResults[filename] = {"seconds": time.perf_counter() - startTime, "fields": result["fields"], "drawingBox": result.get("drawingBox")}
+
+    with tempfile.TemporaryDirectory() as templateDirectory:
+        for templatePass in (1, 2):
+            for filename in filenames:
+                startTime = time.perf_counter()
+                result = extraction.extract(readDrawing(filename, directory), ocrMode, titleLists, useTemplates = True, templateDirectory = templateDirectory, progressiveOcr = progressiveOcr)
+                full = fullResults[filename]
+
+                row = {"filename": filename, "pass": templatePass, "template": result.get("template"), "seconds": time.perf_counter() - startTime, "fullSeconds": full["seconds"], "identical": None}
+
+                if row["template"] not in (None, "learned"): #extracted with a template
+                    row["identical"] = result["fields"] == full["fields"] and result.get("drawingBox") == full["drawingBox"]
+
+                rows.append(row)
+                extracted = "full pipeline" if row["identical"] is None else "template " + row["template"][:8] + ", " + ("same as the full pipeline" if row["identical"] else "DIFFERENT from the full pipeline")
+                print("pass " + str(templatePass) + " " + filename + ": " + format(row["seconds"], ".2f") + "s (full pipeline " + format(full["seconds"], ".2f") + "s), " + extracted)
+
+    return rows
+
+#returns the machine-readable summary of a pipeline benchmark: totals per stage, throughput, peak memory and the accuracy against the golden outputs
+def summarisePipeline(rows, elapsedTime):
+    stageSeconds = {}
+
+    for row in rows:
+        for stage, seconds in row["stageSeconds"].items():
+            stageSeconds[stage] = stageSeconds.get(stage, 0.0) + seconds
+
+    compared = [row["golden"] for row in rows if row["golden"] is not None]
+
+    return {
+        "drawings": len(rows),
+        "succeeded": sum(row["success"] for row in rows),
+        "seconds": elapsedTime,
+        "drawingsPerSecond": len(rows) / max(elapsedTime, 1e-9),
+        "peakRssBytes": peakRssBytes(),
+        "stageSeconds": stageSeconds,
+        "ocrSeconds": sum(row["ocrSeconds"] for row in rows),
+        "tableWords": sum(row["counts"].get("tableWords", 0) for row in rows),
+        "escalatedWords": sum(row["counts"].get("escalatedWords", 0) for row in rows),
+        "escalatedRegions": sum(row["counts"].get("escalatedRegions", 0) for row in rows),
+        "golden": {
+            "compared": len(compared),
+            "missing": sum(row["goldenMissing"] for row in rows),
+            "otherVersion": sum(not golden["versionMatches"] for golden in compared),
+            "identical": sum(golden["identical"] for golden in compared),
+            "boxesMatched": sum(golden["boxMatches"] for golden in compared),
+            "fieldsMatched": sum(golden["fieldsMatched"] for golden in compared),
+            "fieldsExpected": sum(golden["fieldsExpected"] for golden in compared),
+            "fieldsExtracted": sum(golden["fieldsExtracted"] for golden in compared),
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks the stages of the extraction over the sample engineering drawings.")
+    parser.add_argument("directory", nargs = "?", default = extraction.drawingsDirectory, help = "directory containing the engineering drawing images")
+    parser.add_argument("--pipeline", action = "store_true", help = "benchmarks every stage of the pipeline and compares the outputs with the golden outputs, instead of the table mask")
+    parser.add_argument("--compare-templates", action = "store_true", help = "checks that the drawings extracted with layout templates get the same rows and bounding boxes as with the full pipeline")
+    parser.add_argument("--update-golden", action = "store_true", help = "with --pipeline, saves the outputs as the new golden outputs")
+    parser.add_argument("--golden-directory", default = goldenDirectory, help = "directory containing the golden outputs")
+    parser.add_argument("--box-tolerance", type = int, default = 0, help = "pixels the drawing bounding box may differ from the golden output by")
+    parser.add_argument("--synthetic-words", type = int, default = 0, help = "uses this many random word coordinates per drawing instead of OCR")
+    parser.add_argument("--repeats", type = int, default = 3, help = "number of times each stage is timed (the best time is reported)")
+    parser.add_argument("--ocr-mode", default = "page", choices = extraction.ocrModes, help = "OCR mode used by the low-memory and pipeline benchmarks")
+    extraction.addExtractionArguments(parser, "benchmarks the low-memory mode against the full-frame path instead of the table mask, or runs the pipeline in the low-memory mode with --pipeline", "with --pipeline, OCRs the page and tables downscaled first and only OCRs the weak table words again at full resolution")
+    parser.add_argument("--scale", type = float, default = 1, help = "upscales the drawings by this factor to simulate large-format scans")
+    parser.add_argument("-r", "--report", default = None, help = "optional path of a JSON file to save the results to")
+    args = parser.parse_args()
+
+    filenames = ingestion.listImages(args.directory)
+    options = extraction.extractionOptions(args)
+
+    if args.pipeline:
+        startTime = time.perf_counter()
+        rows = benchmarkPipeline(filenames, args.directory, args.ocr_mode, args.scale, options["lowMemory"], options["memoryBudget"], options["titleLists"], args.golden_directory, args.update_golden, args.box_tolerance, options["progressiveOcr"], options["useTemplates"], options["templateDirectory"])
+        summary = summarisePipeline(rows, time.perf_counter() - startTime)
+
+        print("Pipeline: " + str(summary["drawings"]) + " drawings in " + format(summary["seconds"], ".2f") + "s, " + format(summary["drawingsPerSecond"], ".2f") + " drawings/s, peak RSS " + format(summary["peakRssBytes"] / 2**20, ".0f") + "MB")
+        print("OCR: " + format(summary["ocrSeconds"], ".2f") + "s" + (", escalated " + str(summary["escalatedWords"]) + "/" + str(summary["tableWords"]) + " table words to full resolution, checked " + str(summary["escalatedRegions"]) + " unselected table regions at full resolution" if args.progressive_ocr else ""))
+        print("Stages: " + ", ".join(stage + " " + format(seconds, ".2f") + "s" for stage, seconds in sorted(summary["stageSeconds"].items(), key = lambda item: -item[1])))
+
+        if summary["golden"]["missing"]:
+            print("Golden outputs: " + str(summary["golden"]["missing"]) + " drawings have no golden output in " + args.golden_directory + " (create them with --update-golden).")
+
+        if summary["golden"]["otherVersion"]:
+            print("Golden outputs: " + str(summary["golden"]["otherVersion"]) + "/" + str(summary["golden"]["compared"]) + " created with another Tesseract version than " + ocr.tesseractVersion() + ", so their words may legitimately differ.")
+
+        if summary["golden"]["compared"]:
+            print("Golden outputs: " + str(summary["golden"]["identical"]) + "/" + str(summary["golden"]["compared"]) + " identical, " + str(summary["golden"]["fieldsMatched"]) + "/" + str(summary["golden"]["fieldsExpected"]) + " rows and " + str(summary["golden"]["boxesMatched"]) + "/" + str(summary["golden"]["compared"]) + " bounding boxes matched.")
+
+        summary.update({"ocrMode": args.ocr_mode, "scale": args.scale, "lowMemory": args.low_memory, "progressiveOcr": args.progressive_ocr, "templates": args.templates, "ocrBackend": ocr.activeBackend(), "results": rows})
+        passed = summary["golden"]["identical"] == summary["golden"]["compared"] and not summary["golden"]["missing"]
+
+    elif args.compare_templates:
+        rows = benchmarkTemplates(filenames, args.directory, args.ocr_mode, options["titleLists"], options["progressiveOcr"])
+        compared = [row for row in rows if row["identical"] is not None]
+        print("Layout templates: " + str(len(compared)) + "/" + str(len(rows)) + " extractions used a template, " + str(sum(row["identical"] for row in compared)) + "/" + str(len(compared)) + " identical to the full pipeline.")
+
+        summary = {"ocrMode": args.ocr_mode, "progressiveOcr": args.progressive_ocr, "ocrBackend": ocr.activeBackend(), "results": rows}
+        passed = bool(compared) and all(row["identical"] for row in compared) #without any template extraction, nothing was checked
+
+    elif args.low_memory:
+        rows = benchmarkLowMemory(filenames, args.directory, args.ocr_mode, options["memoryBudget"], args.scale)
+        print("Low-memory mode: peak " + format(max(row["lowPeakBytes"] for row in rows) / 2**20, ".0f") + "MB (full-frame " + format(max(row["fullPeakBytes"] for row in rows) / 2**20, ".0f") + "MB), " + str(sum(row["identical"] for row in rows)) + "/" + str(len(rows)) + " results identical.")
+
+        summary = {"results": rows}
+        passed = all(row["identical"] for row in rows)
+
+    else:
+        rows = benchmarkTableMask(filenames, args.directory, args.synthetic_words, args.repeats)
+
+        loopSeconds = sum(row["loopSeconds"] for row in rows)
+        labelSeconds = sum(row["labelSeconds"] for row in rows)
+        print("Table mask: loop " + format(loopSeconds, ".3f") + "s, label image " + format(labelSeconds, ".3f") + "s, " + format(loopSeconds / max(labelSeconds, 1e-9), ".1f") + "x faster, " + str(sum(row["identical"] for row in rows)) + "/" + str(len(rows)) + " masks identical.")
+
+        summary = {"results": rows}
+        passed = all(row["identical"] for row in rows)
+
+    if args.report:
+        with open(args.report, "w") as reportFile:
+            json.dump(summary, reportFile, indent = 2)
+
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,97 @@
+import os
+import time
+import json
+import pickle
+import hashlib
+
+cacheDirectory = "Cache" #directory containing the cached stage results
+cacheVersion = 1 #increase when a change to the extraction would make previously cached results invalid
+
+#returns a content-addressed key from the parsed parts (raw bytes, or any JSON serialisable value such as settings and title lists)
+def makeKey(*parts):
+    digest = hashlib.sha256(str(cacheVersion).encode())
+
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys = True).encode()
+
+        digest.update(hashlib.sha256(part).digest()) #parts are hashed separately so their boundaries can't be confused
+
+    return digest.hexdigest()
+
+#returns the path of the cache entry for the stage and key, entries are spread across sub-directories to keep directories small
+def entryPath(stage, key):
+    return os.path.join(cacheDirectory, stage, key[:2], key + ".pkl")
+
+#returns the value pickled to path, or None if the file is missing or incomplete
+def readPickle(path):
+    try:
+        with open(path, "rb") as pickleFile:
+            return pickle.load(pickleFile)
+
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+#pickles the value to path, creating its directory. The file is replaced in one step so that other workers never read a partially written file
+def writePickle(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+
+    temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryPath, "wb") as pickleFile:
+        pickle.dump(value, pickleFile, pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temporaryPath, path)
+
+#returns the cached value of the stage and key, or None if it isn't cached
+def load(stage, key):
+    path = entryPath(stage, key)
+    value = readPickle(path)
+
+    if value is None: #missing or incomplete entry
+        return None
+
+    try:
+        os.utime(path) #marks the entry as recently used, so it's evicted last
+    except OSError:
+        pass
+
+    return value
+
+#saves the value of the stage and key to the cache
+def store(stage, key, value):
+    writePickle(entryPath(stage, key), value)
+
+#removes the least recently used entries until the cache is at most maxBytes in size, and any entry not used for more than maxAge seconds. Returns the number of removed entries
+def evict(maxBytes = None, maxAge = None):
+    entries = []
+
+    for root, directories, files in os.walk(cacheDirectory):
+        for name in files:
+            path = os.path.join(root, name)
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort() #least recently used entries first
+    totalBytes = sum(size for modified, size, path in entries)
+    now = time.time()
+    removed = 0
+
+    for modified, size, path in entries:
+        expired = maxAge is not None and now - modified > maxAge
+        oversized = maxBytes is not None and totalBytes > maxBytes
+
+        if expired or oversized:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            totalBytes -= size
+            removed += 1
+
+    return removed
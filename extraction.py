@@ -1,18 +1,91 @@
-import pytesseract as pyt
-from pytesseract import Output
 import numpy as np
 import cv2
 import os
+import time
+import argparse
 import datetime
 from openpyxl import Workbook
-from difflib import SequenceMatcher
 
-OCR_config = r'--oem 3 --psm 6' #custom configuration for pytesseract functions
-filelist=os.listdir('Engineering Drawings') #directory containing sample engineering drawing images
+import ocr
+import cache
+import tiling
+import layout
+import matching
+import sinks
+import instrumentation
+import templates
+import ingestion
+
+OCR_config = r'--oem 3 --psm 6' #custom configuration for the tesseract OCR functions
+drawingsDirectory = 'Engineering Drawings' #directory containing sample engineering drawing images
+ocrModes = ["page", "region"] #'page' OCRs the whole sheet and then the table, 'region' only OCRs the candidate table regions once
+minRegionSize = 15 #minimum width/height (in pixels) of a candidate table region OCR'd in 'region' mode
+
+#Thresholding and structuring element parameters of the image processing
+thresholdBlockSize = 11 #size of the pixel neighbourhood used by the adaptive thresholding
+thresholdConstant = 2 #constant subtracted from the weighted mean by the adaptive thresholding
+lineKernelDivisor = 100 #the drawing line structuring elements are the image width divided by this value long
+tableLineKernelDivisor = 160 #the table line structuring elements are the image width divided by this value long
+labelImagePairs = 5000 #above this many contour and word pairs to test, the table mask is built with a label image instead of pointPolygonTest
+
+#Confidence thresholds (0 to 100) of the recognised words
+pageWordConfidence = 70 #minimum confidence of the page words used to identify the tables
+tableWordConfidence = 10 #minimum confidence of the table words used for the titles and values
+
+#Progressive OCR tiers: the page and tables are first OCR'd downscaled, and only the table regions and table words the cheap pass may have missed (see escalateTableRegions, isWeakWord and missedInkBoxes) are OCR'd again from the full resolution image
+cheapOcrScale = 0.5 #scale the page and tables are OCR'd at by the cheap pass
+escalationConfidence = 50 #table words recognised by the cheap pass with a lower confidence are escalated
+maxEscalatedWords = 32 #maximum number of weak table words escalated per table image, the least confident ones
+escalationSimilarity = 0.6 #table words at least this similar to a word of the titles, without matching it, are escalated
+escalationScale = 2 #scale of the full resolution word boxes when they're OCR'd again
+escalationMargin = 4 #pixels around a word box included when it's OCR'd again
+escalationGap = 20 #white pixels around each escalated word box when they're stacked into one image
+minMissedInkHeight = 12 #ink of the table image that no cheap word covers is escalated as a missed word when it's at least this many pixels high, shorter ink is left over from the table lines
+maxMissedInkHeight = 120 #and at most this many pixels high, taller ink (e.g. a logo) isn't a line of text
+escalationConfig = r'--oem 3 --psm 6' #the escalated word boxes are stacked one per line and OCR'd at once as a uniform block of text
 
 #Words around the drawing that shouldn’t be extracted
 wordsToAvoid = ["SIDE", "FRONT", "TOP", "VIEW"]
 
+# 2 nested arrays signifying 2 types of fields (1 for the Amendments Table and 1 for ) Title array to segmentize the table contents (need paraphrasing)
+drawingTitles = [
+    [ # Array containing the main table titles
+        "TITLE:",
+        "DRAWING TITLE:",
+        "DRAWING NUMBER:",
+        "DRAWING NO:",
+        "CONTRACTOR:",
+        "COMPANY:",
+        "COMPANY NAME:",
+        "DRAWN:",
+        "DRAWN BY:",
+        "CHECKED:",
+        "CHECKED BY:",
+        "APPROVED:",
+        "APPROVED BY:",
+        "UNIT:",
+        "PAGE:",
+        "STATUS:",
+        "STS:",
+        "LANG:",
+        "PROJECT NO:",   
+        "FONT:",
+        "CAD NO:",
+    ],
+    [ # Array containing the Amendments table titles
+        "AMENDMENTS",
+        "REV",
+        "ISSUE",
+        "CHANGE(S)",
+        "CKD",
+        "DATE",
+        "BY",
+    ]
+]
+
+#Titles whose values can span several words on the same row
+multiWordValueTitles = ["DRAWING NO.:", "DRAWING NUMBER:", "PROJECT NO:", "CAD NO:"]
+
 #User-defined Functions that are repeatedly used throughout the program
 #converts the extracted date value (string) to the datetime object with the specified format, "%d/%m/%y"
 def formatDate(date):
@@ -25,371 +98,998 @@ def formatDate(date):
     except ValueError:
         return False
     
-#return the similarity ratio between 2 parsed string values
-def returnSimilarRatio(inp1, inp2): #return the similarity ratio between 2 parsed string values
-    return SequenceMatcher(None, inp1, inp2).ratio()
+#checks if a word recognised on the page is an appropriate word to identify a table with
+def isPageWord(data, i):
+    if int(float(data['conf'][i])) > pageWordConfidence: #ensures words fulfils confidence score threshold to ensure accuracy
+        string = data['text'][i]
+        if (len(string) > 1): #ensure word is not blank
+            if any(c.isalpha() for c in string) and (not any(word in string for word in wordsToAvoid)) or formatDate(string): #ensure word consists of alphabets, not part of the WordsToAvoid list, unless its a date value
+                return True
+    
+    return False
 
-#Creating directories to store results
-#Create Results directory
-try:
-    os.makedirs("Results", exist_ok = True)
-    print("SUCCESS: The 'Results' directory was created successfully.")
+#OCRs an image downscaled by scale, with the coordinates of the words mapped back to the full resolution image
+def ocrScaled(image, scale, config = OCR_config):
+    if scale == 1:
+        return ocr.imageToData(image, config)
     
-except OSError as error:
-    print("ERROR: The 'Results' directory was NOT CREATED successfully.")
+    data = ocr.imageToData(cv2.resize(image, None, fx = scale, fy = scale, interpolation = cv2.INTER_AREA), config)
     
-#Create nested directory with Drawings file under Results
-try:
-    os.makedirs("Results/Drawings", exist_ok = True)
-    print("SUCCESS: The 'Drawings' directory was created successfully.")
+    for column in ("left", "top", "width", "height"):
+        data[column] = [int(round(value / scale)) for value in data[column]]
     
-except OSError as error:
-    print("ERROR: The 'Drawings' directory was NOT CREATED successfully.")
+    return data
+
+#OCRs the (thresholded) page for the words used to identify the tables, returning the word data and the indices of the appropriate words (see isPageWord).
+#With progressiveOcr, the page is OCR'd downscaled by cheapOcrScale, and the table regions its words miss are found by escalateTableRegions
+def recognisePageWords(imgThreshInv, progressiveOcr = False):
+    imageData = ocrScaled(imgThreshInv, cheapOcrScale if progressiveOcr else 1)
+    return imageData, [i for i in range(len(imageData['text'])) if isPageWord(imageData, i)]
 
-#Create nested directory with Drawing Data file under Results
-try:
-    os.makedirs("Results/Drawing Data", exist_ok = True)
-    print("SUCCESS: The 'Drawing Data' directory was created successfully.")
+#Full resolution check of the progressive page OCR: the candidate table regions (see extractTextRegions) that the words of the cheap page OCR didn't select, e.g. a title block in small print, are OCR'd at full resolution,
+#and the ones containing an appropriate word are added to finalMask. This covers a page where the cheap words select no region at all as well. The number of regions OCR'd is added to result["counts"]
+def escalateTableRegions(imgGrayscale, finalMask, canny_contours, cannyContourAreas, sELength2, result):
+    nrow, ncol = finalMask.shape
+    unselected = [i for i, c in enumerate(canny_contours) if cannyContourAreas[i] < nrow * ncol * 0.5 and finalMask[c[0][0][1], c[0][0][0]] == 0] #regions inside a selected region are covered by it
     
-except OSError as error:
-    print("ERROR: The 'Drawing Data' directory was NOT CREATED successfully.")
+    regionCount = extractTextRegions(imgGrayscale, [canny_contours[i] for i in unselected], [cannyContourAreas[i] for i in unselected], sELength2, finalMask = finalMask)[2]
+    addCounts(result, escalatedRegions = regionCount)
 
-for filename in filelist[:]: #loops through every image file in the sample engineering images directory
-    if filename.endswith(".png"): #only processes images with png extension
-        img = cv2.imread('Dataset_2021/' + filename, 1)
-        
-        #Part 1 - Extracting the Drawing Image
-        # Converts image to grayscale
-        imgGrayscale = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+#checks if a table word recognised by the cheap OCR pass is weak, i.e. recognised with less than escalationConfidence, looking like a date (with a "/") that formatDate rejects,
+#or similar to a word of the titles (titleWords, compiled by matching.compileTitles) without matching it
+def isWeakWord(data, i, titleWords):
+    string = data['text'][i].strip().upper()
+    
+    if not string: #not a word
+        return False
+    
+    if float(data['conf'][i]) < escalationConfidence:
+        return True
+    
+    if "/" in string and not formatDate(string):
+        return True
+    
+    return matching.matchTitle(string, titleWords, escalationSimilarity) is not None and matching.matchTitle(string, titleWords) is None
 
-        nrow, ncol = imgGrayscale.shape #retrieves image's number of rows and columns
-        
-        imgThreshInv = cv2.adaptiveThreshold(imgGrayscale, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2) #makes it a binary image using adaptive thresholding and performs inversion
-        
-        #extracting data from image using tesseract OCR function
-        imageData = pyt.image_to_data(imgThreshInv, output_type = Output.DICT, config = OCR_config)
-        
-        # Filtering raw data from image for location details/coordinates of words
-        filteredImageData = []
+#returns the boxes (x0, y0, x1, y1) of the ink of a table image that no word recognised by the cheap OCR pass (data) covers, e.g. a value the cheap pass missed entirely, the largest first.
+#The ink is grouped into words by dilating it horizontally by escalationMargin, and only groups between minMissedInkHeight and maxMissedInkHeight high are kept
+def missedInkBoxes(tableImage, data):
+    nrow, ncol = tableImage.shape
+    ink = cv2.threshold(tableImage, 127, 255, cv2.THRESH_BINARY_INV)[1] #the table image is already binary, without its lines
+    
+    for i in range(len(data['text'])):
+        if data['level'][i] == 5 and data['text'][i].strip():
+            ink[max(data['top'][i] - escalationMargin, 0):data['top'][i] + data['height'][i] + escalationMargin, max(data['left'][i] - escalationMargin, 0):data['left'][i] + data['width'][i] + escalationMargin] = 0
+    
+    ink = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (2 * escalationMargin + 1, 1)), dst = ink)
+    boxes = [cv2.boundingRect(c) for c in cv2.findContours(ink, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]] #the dilation already added the margin to the left and right
+    boxes = sorted((box for box in boxes if minMissedInkHeight <= box[3] <= maxMissedInkHeight), key = lambda box: box[2] * box[3], reverse = True)
+    
+    return [(x, max(y - escalationMargin, 0), x + w, min(y + h + escalationMargin, nrow)) for x, y, w, h in boxes]
+
+#OCRs a table image (without its lines, see removeTableLines) for the table words, returning the word data and the number of escalated words.
+#With progressiveOcr, the table is OCR'd downscaled by cheapOcrScale, and only the boxes of the weak words (see isWeakWord) and of the ink the cheap pass missed (see missedInkBoxes) are OCR'd again, enlarged from the full resolution image.
+#At most maxEscalatedWords boxes are escalated, the least confident weak words first. They are stacked one per line into one image, OCR'd with a single escalationConfig call, and each recognised word is mapped back to the box containing its vertical centre.
+#A weak word is replaced when it's recognised with a higher confidence than by the cheap pass, and the words recognised in the missed ink are added
+def recogniseTableWords(tableImage, progressiveOcr = False, titleLists = drawingTitles):
+    if not progressiveOcr:
+        return ocr.imageToData(tableImage, OCR_config), 0
+    
+    nrow, ncol = tableImage.shape
+    data = ocrScaled(tableImage, cheapOcrScale)
+    titleWords = matching.compileTitles(sorted({word for title in titleLists[0] + titleLists[1] for word in title.split()}))
+    weakWords = sorted((i for i in range(len(data['text'])) if isWeakWord(data, i, titleWords)), key = lambda i: float(data['conf'][i]))[:maxEscalatedWords]
+    
+    boxes = [(i, (data['left'][i] - escalationMargin, data['top'][i] - escalationMargin, data['left'][i] + data['width'][i] + escalationMargin, data['top'][i] + data['height'][i] + escalationMargin)) for i in weakWords]
+    boxes += [(None, box) for box in missedInkBoxes(tableImage, data)[:maxEscalatedWords - len(weakWords)]] #missed ink has no word to replace
+    escalatedWords, wordBoxes, wordImages = [], [], []
+    
+    for i, (x0, y0, x1, y1) in boxes:
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, ncol), min(y1, nrow)
         
-        #filters the raw data that's been extracted from the image. Applies If checking to ensure only appropriate words are accepted
-        for i in range(len(imageData['text'])):
-            if int(float(imageData['conf'][i])) > 70: #ensures words fulfils confidence score threshold to ensure accuracy
-                string = imageData['text'][i]
-                if (len(string) > 1): #ensure word is not blank
-                    if any(c.isalpha() for c in string) and (not any(word in string for word in wordsToAvoid)) or formatDate(string): #ensure word consists of alphabets, not part of the WordsToAvoid list, unless its a date value
-                        filteredImageData.append(i)
+        if x1 > x0 and y1 > y0:
+            escalatedWords.append(i)
+            wordBoxes.append((x0, y0))
+            wordImages.append(cv2.resize(tableImage[y0:y1, x0:x1], None, fx = escalationScale, fy = escalationScale, interpolation = cv2.INTER_CUBIC))
+    
+    if not escalatedWords:
+        return data, 0
+    
+    # Stacking the word boxes with a white gap around each, as Tesseract needs a white margin around the text and between the lines
+    stackedImage = np.full((sum(wordImage.shape[0] + escalationGap for wordImage in wordImages) + escalationGap, max(wordImage.shape[1] for wordImage in wordImages) + 2 * escalationGap), 255, dtype=np.uint8)
+    boxTops = []
+    y = escalationGap
+    
+    for wordImage in wordImages:
+        stackedImage[y:y + wordImage.shape[0], escalationGap:escalationGap + wordImage.shape[1]] = wordImage
+        boxTops.append(y)
+        y += wordImage.shape[0] + escalationGap
+    
+    stackedData = ocr.imageToData(stackedImage, escalationConfig)
+    boxWords = [[] for i in escalatedWords]
+    
+    for j in sorted(range(len(stackedData['text'])), key = lambda j: stackedData['left'][j]):
+        if stackedData['text'][j].strip():
+            box = np.searchsorted(boxTops, stackedData['top'][j] + stackedData['height'][j] / 2, side = "right") - 1
             
-        # Creating and applying horizontal and vertical line masks
-        sELength1 = np.array(imgGrayscale).shape[1]//100
-        
-        verticalSE = cv2.getStructuringElement(cv2.MORPH_RECT, (1, sELength1))
-        horizontalSE = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength1, 1))
-        sE = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-        
-        # Vertical and horizontal kernels are processed to form the lines through morphology open
-        verticalLines = cv2.morphologyEx(imgThreshInv, cv2.MORPH_OPEN, verticalSE, iterations=3)
-        horizontalLines = cv2.morphologyEx(imgThreshInv, cv2.MORPH_OPEN, horizontalSE, iterations=3)
-        
-        # Combine lines together and dilate to make thicker
-        imgLines = cv2.add(verticalLines, horizontalLines)
-        imgLines = cv2.dilate(imgLines, sE, iterations=2)
-        
-        # Detecting Contours within the horizontal and vertical line mask
-        contours, hierarchy = cv2.findContours(imgLines, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
-        mask = np.zeros((nrow, ncol), dtype=np.uint8)
-        
-        #Drawing the contours to the mask
-        for c in contours:
-            if cv2.contourArea(c) < nrow * ncol * 0.5:
-                cv2.drawContours(mask, [c], -1, 255, -1)
-        
-        sE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength1, sELength1))
-        mask_morphClose = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, sE2, iterations=3) #Mask is processed through morphology closing to close the empty spaces
-        
-        canny_contours, hierarchy = cv2.findContours(mask_morphClose, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE) # contours in the mask are detected
-        
-        finalMask = np.zeros((nrow, ncol), dtype=np.uint8) 
-        
-        #Drawing contours to the finalMask, according to the 2 if control statements
-        for c in canny_contours:
-            if cv2.contourArea(c) < nrow * ncol * 0.5:
-                for i in filteredImageData:
-                    d = cv2.pointPolygonTest(c, (imageData['left'][i], imageData['top'][i]), False) #determine if the point exists in the contour. If so, d>0 and contour is drawn
-                    if d >= 0:
-                        cv2.drawContours(finalMask, [c], -1, 255, -1)
-                        break 
+            if box >= 0:
+                boxWords[box].append(j)
+    
+    missedWords = 0
+    
+    for i, words, (x0, y0), boxTop in zip(escalatedWords, boxWords, wordBoxes, boxTops):
+        if i is None: #words of the missed ink, mapped back from the stacked image to the table image
+            for j in words:
+                missedWord = {"level": 5, "page_num": 1, "block_num": 0, "par_num": 0, "line_num": 0, "word_num": 0, "conf": stackedData['conf'][j], "text": stackedData['text'][j],
+                              "left": x0 + int(round((stackedData['left'][j] - escalationGap) / escalationScale)), "top": y0 + int(round((stackedData['top'][j] - boxTop) / escalationScale)),
+                              "width": int(round(stackedData['width'][j] / escalationScale)), "height": int(round(stackedData['height'][j] / escalationScale))}
+                
+                for column in data:
+                    data[column].append(missedWord[column])
+                
+                missedWords += 1
         
-        # Extracting Image from Original Image Using Mask
-        extractedTable = cv2.bitwise_and(imgGrayscale, finalMask)
-        extractedDrawing = cv2.add(cv2.bitwise_and(cv2.bitwise_not(imgThreshInv), cv2.bitwise_not(finalMask)), finalMask)
+        elif words and min(float(stackedData['conf'][j]) for j in words) > float(data['conf'][i]):
+            data['text'][i] = " ".join(stackedData['text'][j] for j in words)
+            data['conf'][i] = min(float(stackedData['conf'][j]) for j in words)
+    
+    if missedWords:
+        data = sortReadingOrder(data) #the added words are matched with the words next to them
+    
+    return data, len(escalatedWords)
+
+#removes the horizontal and vertical borders/lines of a (grayscale) table image, so that only the table text remains
+def removeTableLines(tableImage, sELength2):
+    # Thresholding and inverting image containing only the tables
+    tableThreshInv = cv2.adaptiveThreshold(tableImage, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, thresholdBlockSize, thresholdConstant)
+    
+    # Creating horizontal and vertical line mask using structuring elements
+    verticalSE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (1, sELength2))
+    horizontalSE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength2, 1))
+    
+    # Creating the vertical and horizontal lines of the table and combining
+    tableVerticalLines = cv2.morphologyEx(tableThreshInv, cv2.MORPH_OPEN, verticalSE2, iterations=3)
+    tableHorizontalLines = cv2.morphologyEx(tableThreshInv, cv2.MORPH_OPEN, horizontalSE2, iterations=3)
+    tableLines = cv2.add(tableVerticalLines, tableHorizontalLines)
+    
+    # Using the combination of the vertical and horizontal lines to remove the table borders/lines
+    tableImageWithoutLinesInv = cv2.subtract(tableThreshInv, tableLines)
+    return cv2.bitwise_not(tableImageWithoutLinesInv)
+
+#sorts OCR word data into reading order (rows from top to bottom, words from left to right), as words from separately recognised regions are otherwise grouped per region
+def sortReadingOrder(data):
+    order = sorted(range(len(data['text'])), key = lambda i: (data['top'][i], data['left'][i]))
+    rows = []
+    rowTop = None
+    
+    for i in order:
+        if rowTop is None or data['top'][i] - rowTop > 5: #word starts a new row
+            rows.append([])
+            rowTop = data['top'][i]
         
-        extractedBorders = np.zeros((nrow, ncol), dtype=np.uint8)
+        rows[-1].append(i)
+    
+    order = [i for row in rows for i in sorted(row, key = lambda i: data['left'][i])]
+    return {column: [data[column][i] for i in order] for column in data}
+
+#Region-restricted OCR. Instead of OCRing the whole sheet, only the candidate table regions proposed by the line/contour detection are cropped and recognised, once each.
+#Returns the table mask (the regions containing words, drawn to finalMask when passed), the word data of those regions mapped back to page coordinates, to be used in place of the table OCR, and the number of regions OCR'd.
+#With progressiveOcr, each region is OCR'd by recogniseTableWords' tiers, and the number of escalated words is added to result["counts"]
+def extractTextRegions(imgGrayscale, canny_contours, cannyContourAreas, sELength2, progressiveOcr = False, titleLists = drawingTitles, result = None, finalMask = None):
+    nrow, ncol = imgGrayscale.shape
+    margin = sELength2 * 3 + thresholdBlockSize #context around each region so thresholding and line removal match the full table image
+    
+    if finalMask is None:
+        finalMask = np.zeros((nrow, ncol), dtype=np.uint8)
+    
+    tableData = {column: [] for column in ocr.dataColumns}
+    recognisedContours = []
+    escalatedWords = 0
+    
+    # larger regions first, so regions nested inside an already recognised region are skipped
+    candidates = [c for c, area in sorted(zip(canny_contours, cannyContourAreas), key = lambda contour: contour[1], reverse = True) if area < nrow * ncol * 0.5]
+    
+    for c in candidates:
+        point = (int(c[0][0][0]), int(c[0][0][1]))
+        if any(cv2.pointPolygonTest(r, point, False) >= 0 for r in recognisedContours):
+            continue
         
-        #drawing the found contours to obtain the extracted borders outline
-        for c in contours:
-            if cv2.contourArea(c) > nrow * ncol * 0.5:    
-                cv2.drawContours(extractedBorders, [c], -1, 255, 1)
+        x, y, w, h = cv2.boundingRect(c)
+        if min(w, h) < minRegionSize: #regions such as dimension lines are too thin to contain a line of text
+            continue
         
-        #making the extracted borders appear thicker
-        sE3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        extractedBorders = cv2.dilate(extractedBorders, sE3, iterations = 4)
+        recognisedContours.append(c)
         
-        extractedDrawing = cv2.add(extractedDrawing, extractedBorders) #combining extracted drawing and borders
+        x0, y0 = max(x - margin, 0), max(y - margin, 0)
+        x1, y1 = min(x + w + margin, ncol), min(y + h + margin, nrow)
         
-        sE_finalMask = cv2.getStructuringElement(cv2.MORPH_RECT, (20, 20))
-        finalMask = cv2.dilate(finalMask, sE_finalMask, 1) #to enlarge the mask area to ensure table borders are removed from final drawing image
+        regionMask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.drawContours(regionMask, [c], -1, 255, -1, offset = (-x0, -y0))
+        regionTable = cv2.bitwise_and(imgGrayscale[y0:y1, x0:x1], regionMask) #only the pixels of this region
         
-        image_withoutTable = cv2.bitwise_or(imgGrayscale, finalMask) #to remove tables from the image, to only extract the drawing
-        extractedDrawing = cv2.bitwise_not(extractedDrawing)
-        imageCoords = cv2.findNonZero(extractedDrawing) # Retrieve the points which are non-zero value
-        x, y, w, h = cv2.boundingRect(imageCoords) # Determine the coordinates of the minimum spanning box
-        croppedDrawingImage = image_withoutTable[y:y+h, x:x+w] # Using the coordinates from before to crop image to only include contents within the minimum spanning box      
-        croppedDrawingImage = cv2.copyMakeBorder(croppedDrawingImage, 30, 30, 30, 30, cv2.BORDER_CONSTANT, value=(255,255,255)) # Adding 30pixel white border for better output appearance
-
-        cv2.imwrite("Results/Drawings/" + filename[:-4] + "_drawing.png", croppedDrawingImage) # Exporting and saving the cropped drawing image
-
-        #Part 2 - Extracting the Table Data
-        # Thresholding and inverting image containing only the tables
-        tableThreshInv = cv2.adaptiveThreshold(extractedTable, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+        regionData, escalated = recogniseTableWords(removeTableLines(regionTable, sELength2), progressiveOcr, titleLists)
+        escalatedWords += escalated
+        words = [i for i in range(len(regionData['text'])) if regionData['level'][i] == 5]
         
-        # Creating horizontal and vertical line mask using structuring elements
-        sELength2 = np.array(imgGrayscale).shape[1]//160
+        for i in words: #maps the coordinates of the crop back to page space
+            regionData['left'][i] += x0
+            regionData['top'][i] += y0
         
-        verticalSE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (1, sELength2))
-        horizontalSE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength2, 1))
+        #the region is part of the table if it contains an appropriate word, the same rule used for the full page OCR
+        if any(isPageWord(regionData, i) and cv2.pointPolygonTest(c, (regionData['left'][i], regionData['top'][i]), False) >= 0 for i in words):
+            cv2.drawContours(finalMask, [c], -1, 255, -1)
+            
+            for column in tableData:
+                tableData[column].extend(regionData[column][i] for i in words)
+    
+    if progressiveOcr:
+        addCounts(result, escalatedWords = escalatedWords)
+    
+    return finalMask, sortReadingOrder(tableData), len(recognisedContours)
+
+#returns the settings that the recognised words and the drawing image depend on, used to identify cached results
+def pipelineSettings():
+    return {
+        "OCR_config": OCR_config,
+        "wordsToAvoid": wordsToAvoid,
+        "minRegionSize": minRegionSize,
+        "thresholdBlockSize": thresholdBlockSize,
+        "thresholdConstant": thresholdConstant,
+        "lineKernelDivisor": lineKernelDivisor,
+        "tableLineKernelDivisor": tableLineKernelDivisor,
+        "pageWordConfidence": pageWordConfidence,
+        "tableWordConfidence": tableWordConfidence,
+    }
+
+#returns the settings of the progressive OCR tiers, which the recognised words also depend on when progressive OCR is used
+def progressiveOcrSettings():
+    return {
+        "cheapOcrScale": cheapOcrScale,
+        "escalationConfidence": escalationConfidence,
+        "escalationSimilarity": escalationSimilarity,
+        "escalationScale": escalationScale,
+        "escalationMargin": escalationMargin,
+        "escalationConfig": escalationConfig,
+        "maxEscalatedWords": maxEscalatedWords,
+        "escalationGap": escalationGap,
+        "minMissedInkHeight": minMissedInkHeight,
+        "maxMissedInkHeight": maxMissedInkHeight,
+    }
+
+#Detects the contours of the horizontal and vertical lines, and the contours of the regions enclosed by the lines (e.g. the tables) after closing. Both are returned with their areas.
+#With a memoryBudget (low-memory mode), the line and closing morphology is applied to overlapping strips instead of the whole image. In both modes, the lines image is reused in place for the mask, so only 1 full size image is allocated
+def detectContours(imgThreshInv, memoryBudget = None):
+    nrow, ncol = imgThreshInv.shape
+    
+    # Vertical and horizontal lines are formed through morphology open, combined and dilated to make thicker.
+    # 3 opening (erosion and dilation) iterations reach up to 6 structuring element lengths, and the dilation 2 more rows
+    sELength1 = ncol//lineKernelDivisor
+    imgLines = tiling.applyOperation(imgThreshInv, None, lambda image: lineMorphology(image, sELength1), sELength1 * 6 + 4, memoryBudget)
+    
+    # Detecting Contours within the horizontal and vertical line mask
+    contours, hierarchy = cv2.findContours(imgLines, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contourAreas = [cv2.contourArea(c) for c in contours] #computed once, as the areas are used to filter both the mask and the borders
+    
+    mask = imgLines #the lines image is no longer needed, so its buffer is reused for the mask
+    mask.fill(0)
+    
+    #Drawing the contours to the mask
+    for c, area in zip(contours, contourAreas):
+        if area < nrow * ncol * 0.5:
+            cv2.drawContours(mask, [c], -1, 255, -1)
+    
+    sE2 = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength1, sELength1))
+    mask_morphClose = tiling.applyOperation(mask, mask, lambda image: cv2.morphologyEx(image, cv2.MORPH_CLOSE, sE2, iterations=3), sELength1 * 6, memoryBudget) #Mask is processed through morphology closing to close the empty spaces
+    
+    canny_contours, hierarchy = cv2.findContours(mask_morphClose, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE) # contours in the mask are detected
+    cannyContourAreas = [cv2.contourArea(c) for c in canny_contours]
+    
+    return contours, contourAreas, canny_contours, cannyContourAreas
+
+#returns the vertical and horizontal lines of (a strip or region of) the thresholded image combined and dilated, the same as detectContours finds, with structuring elements sELength1 long
+def lineMorphology(image, sELength1):
+    verticalSE = cv2.getStructuringElement(cv2.MORPH_RECT, (1, sELength1))
+    horizontalSE = cv2.getStructuringElement(cv2.MORPH_RECT, (sELength1, 1))
+    sE = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+    
+    lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, verticalSE, iterations=3)
+    cv2.add(lines, cv2.morphologyEx(image, cv2.MORPH_OPEN, horizontalSE, iterations=3), dst=lines)
+    return cv2.dilate(lines, sE, iterations=2)
+
+#returns the table lines of a region (x, y, w, h) of the thresholded image, the same as the lines detectContours finds in the whole image, as the morphology is applied with enough margin around the region.
+#The parts of the region outside the image have no lines, so the returned image is always h x w
+def regionLines(imgThreshInv, box):
+    nrow, ncol = imgThreshInv.shape
+    sELength1 = ncol//lineKernelDivisor
+    margin = sELength1 * 6 + 4 #reach of the 3 opening iterations and the dilation
+    
+    x, y, w, h = box
+    x0, y0 = max(x - margin, 0), max(y - margin, 0)
+    lines = lineMorphology(imgThreshInv[y0:min(y + h + margin, nrow), x0:min(x + w + margin, ncol)], sELength1)
+    
+    x1, y1 = max(x, 0), max(y, 0) #the part of the region inside the image
+    x2, y2 = max(min(x + w, ncol), x1), max(min(y + h, nrow), y1)
+    boxLines = np.zeros((h, w), dtype=np.uint8)
+    boxLines[y1 - y:y2 - y, x1 - x:x2 - x] = lines[y1 - y0:y2 - y0, x1 - x0:x2 - x0]
+    
+    return boxLines
+
+#Saves the layout of a drawing, to learn a layout template from: the outlines of its table regions (from finalMask) with their table lines, and its border contours
+def saveGeometry(geometry, imgThreshInv, finalMask, contours, contourAreas):
+    nrow, ncol = imgThreshInv.shape
+    
+    geometry["regions"] = cv2.findContours(finalMask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    geometry["lines"] = [regionLines(imgThreshInv, templates.linesBox(region)) for region in geometry["regions"]]
+    geometry["borders"] = [c for c, area in zip(contours, contourAreas) if area > nrow * ncol * 0.5]
+
+#Builds a label image of the contours drawn filled from the smallest to the largest area, so each pixel holds the label (index + 1) of the largest contour containing it, or 0.
+#The label image only covers the parsed region (x, y, w, h) of the image
+def contourLabelImage(contours, contourAreas, region):
+    x, y, w, h = region
+    labels = np.zeros((h, w), dtype=np.uint8 if len(contours) < 255 else np.uint16 if len(contours) < 65535 else np.int32) #smallest type that holds every label
+    
+    for i in sorted(range(len(contours)), key = lambda i: contourAreas[i]):
+        cv2.drawContours(labels, contours, i, i + 1, -1, offset = (-x, -y))
+    
+    return labels
+
+#Draws the contours (smaller than half the image) that contain any of the word coordinates to a mask.
+#Contours without any word inside their bounding box are discarded with one vectorised comparison, and only the words inside the bounding box of a remaining contour are tested with pointPolygonTest, skipping the contours nested in an already drawn contour.
+#When there are more than labelImagePairs remaining contour and word pairs, each word's contour is instead looked up with one index into the label image of the remaining contours, where smaller contours nested in a drawn contour are already covered by it
+def textContourMask(contours, contourAreas, lefts, tops, shape):
+    nrow, ncol = shape
+    finalMask = np.zeros((nrow, ncol), dtype=np.uint8)
+    
+    lefts = np.asarray(lefts, dtype=np.intp)
+    tops = np.asarray(tops, dtype=np.intp)
+    candidates = [i for i in range(len(contours)) if contourAreas[i] < nrow * ncol * 0.5]
+    
+    if len(candidates) == 0 or len(lefts) == 0:
+        return finalMask
+    
+    # bounding boxes of the candidate contours (x, y, w, h), only the contours with a word inside their box are kept
+    boxes = np.array([cv2.boundingRect(contours[i]) for i in candidates]).reshape(-1, 4)
+    wordInBox = (lefts[:, None] >= boxes[:, 0]) & (lefts[:, None] < boxes[:, 0] + boxes[:, 2]) & (tops[:, None] >= boxes[:, 1]) & (tops[:, None] < boxes[:, 1] + boxes[:, 3])
+    kept = np.flatnonzero(wordInBox.any(axis=0))
+    
+    if len(kept) == 0:
+        return finalMask
+    
+    if wordInBox[:, kept].sum() <= labelImagePairs: #few words to test, e.g. the sample drawings have about 10 table regions
+        drawnContours = []
         
-        # Creating the vertical and horizontal lines of the table and combining
-        tableVerticalLines = cv2.morphologyEx(tableThreshInv, cv2.MORPH_OPEN, verticalSE2, iterations=3)
-        tableHorizontalLines = cv2.morphologyEx(tableThreshInv, cv2.MORPH_OPEN, horizontalSE2, iterations=3)
-        tableLines = cv2.add(tableVerticalLines, tableHorizontalLines)
+        # larger contours first, so contours nested inside an already drawn contour (which are covered by it) aren't drawn again
+        for j in sorted(kept, key = lambda j: contourAreas[candidates[j]], reverse = True):
+            c = contours[candidates[j]]
+            point = (int(c[0][0][0]), int(c[0][0][1]))
+            
+            if any(cv2.pointPolygonTest(drawn, point, False) >= 0 for drawn in drawnContours):
+                continue
+            
+            if any(cv2.pointPolygonTest(c, (int(lefts[k]), int(tops[k])), False) >= 0 for k in np.flatnonzero(wordInBox[:, j])):
+                drawnContours.append(c)
         
-        # Using the combination of the vertical and horizontal lines to remove the table borders/lines
-        tableImageWithoutLinesInv = cv2.subtract(tableThreshInv, tableLines)
-        tableImageWithoutLines = cv2.bitwise_not(tableImageWithoutLinesInv)
+        cv2.drawContours(finalMask, drawnContours, -1, 255, -1) #drawn at once, none of them is nested in another
+        return finalMask
+    
+    candidates = [candidates[j] for j in kept]
+    boxes = boxes[kept]
+    x, y = boxes[:, 0].min(), boxes[:, 1].min()
+    w, h = (boxes[:, 0] + boxes[:, 2]).max() - x, (boxes[:, 1] + boxes[:, 3]).max() - y
+    
+    labels = contourLabelImage([contours[i] for i in candidates], [contourAreas[i] for i in candidates], (x, y, w, h))
+    
+    insideRegion = (lefts >= x) & (lefts < x + w) & (tops >= y) & (tops < y + h)
+    wordLabels = np.unique(labels[tops[insideRegion] - y, lefts[insideRegion] - x])
+    
+    for label in wordLabels[wordLabels > 0]:
+        cv2.drawContours(finalMask, [contours[candidates[int(label) - 1]]], -1, 255, -1)
+    
+    return finalMask
+
+#Creating directories to store results
+def createResultDirectories():
+    #Create Results directory
+    try:
+        os.makedirs("Results", exist_ok = True)
+        print("SUCCESS: The 'Results' directory was created successfully.")
+    
+    except OSError as error:
+        print("ERROR: The 'Results' directory was NOT CREATED successfully.")
+    
+    #Create nested directory with Drawings file under Results
+    try:
+        os.makedirs("Results/Drawings", exist_ok = True)
+        print("SUCCESS: The 'Drawings' directory was created successfully.")
+    
+    except OSError as error:
+        print("ERROR: The 'Drawings' directory was NOT CREATED successfully.")
+
+    #Create nested directory with Drawing Data file under Results
+    try:
+        os.makedirs("Results/Drawing Data", exist_ok = True)
+        print("SUCCESS: The 'Drawing Data' directory was created successfully.")
+    
+    except OSError as error:
+        print("ERROR: The 'Drawing Data' directory was NOT CREATED successfully.")
+
+#adds the time since startTime to the stage's total in result["stageSeconds"], and returns the current time so that consecutive stages are timed with one call each
+def timeStage(result, stage, startTime):
+    now = time.perf_counter()
+    stageSeconds = result.setdefault("stageSeconds", {})
+    stageSeconds[stage] = stageSeconds.get(stage, 0.0) + now - startTime
+    
+    return now
+
+#adds counts (e.g. of contours or recognised words) to result["counts"], used by the instrumentation
+def addCounts(result, **counts):
+    if result is not None:
+        result.setdefault("counts", {}).update(counts)
+
+#returns the number of recognised (non-blank) words in OCR data
+def countWords(data):
+    return sum(1 for text in data['text'] if text.strip())
+
+#Part 1 - extracts the drawing image (cropped, without tables) from the grayscale image and recognises the words of the tables.
+#The time of each stage is added to result["stageSeconds"], the image size and contour and word counts to result["counts"], and the bounding box (x, y, w, h) of the drawing before cropping is saved in result["drawingBox"].
+#With lowMemory (for large-format scans, with the same results), the thresholding and morphology is applied to overlapping strips bounded by memoryBudget, and intermediate images are computed in place into the buffers of images that are no longer needed, including the parsed imgGrayscale.
+#At most 4 full size images (grayscale, threshold, mask and table) are then alive at once.
+#When a geometry dict is passed, the outlines of the table regions with their table lines and the border contours are saved in it, to learn a layout template from (see saveGeometry).
+#With progressiveOcr, the page and tables are OCR'd by tiers (see recognisePageWords and recogniseTableWords), escalating the weak words checked against titleLists
+def extractDrawingAndTable(imgGrayscale, ocrMode, result, lowMemory = False, memoryBudget = tiling.tileMemoryBudget, geometry = None, progressiveOcr = False, titleLists = drawingTitles):
+    nrow, ncol = imgGrayscale.shape #retrieves image's number of rows and columns
+    memoryBudget = memoryBudget if lowMemory else None #the operations are applied to the whole image, unless there is a budget for the strips
+    startTime = time.perf_counter()
+    
+    imgThreshInv = tiling.applyOperation(imgGrayscale, None, lambda image: cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, thresholdBlockSize, thresholdConstant), thresholdBlockSize // 2, memoryBudget) #makes it a binary image using adaptive thresholding and performs inversion
+    startTime = timeStage(result, "threshold", startTime)
+    
+    if ocrMode == "page":
+        #extracting data from image using tesseract OCR function, and filtering the raw data for the location details/coordinates of the appropriate words
+        imageData, filteredImageData = recognisePageWords(imgThreshInv, progressiveOcr)
+        result["ocrSeconds"] += time.perf_counter() - startTime
+        startTime = timeStage(result, "page OCR", startTime)
         
-        # Extracting data from the table with removed borders
-        extractedTableData = pyt.image_to_data(tableImageWithoutLines, output_type = Output.DICT, config = OCR_config)
+        addCounts(result, pageWords = countWords(imageData), pageWordsFiltered = len(filteredImageData))
         
-        # Filters the raw data without much If checking/restrictions
-        filteredTableData = []
+    contours, contourAreas, canny_contours, cannyContourAreas = detectContours(imgThreshInv, memoryBudget)
+    startTime = timeStage(result, "line morphology", startTime)
+    addCounts(result, width = ncol, height = nrow, contours = len(contours), tableRegions = len(canny_contours))
+    
+    sELength2 = ncol//tableLineKernelDivisor #structuring element length used for the table lines
     
-        for i in range(len(extractedTableData['text'])):
-            if int(float(extractedTableData['conf'][i])) > 10: #ensures words fulfils confidence score threshold to ensure accuracy
-                filteredTableData.append(i)
+    if ocrMode == "region":
+        #only the candidate table regions are OCR'd, and their words are reused for the table data in Part 2
+        finalMask, extractedTableData = extractTextRegions(imgGrayscale, canny_contours, cannyContourAreas, sELength2, progressiveOcr, titleLists, result)[:2]
+        result["ocrSeconds"] += time.perf_counter() - startTime
+        startTime = timeStage(result, "region OCR", startTime)
+    
+    else:
+        #Drawing the contours containing the filtered words to the finalMask
+        finalMask = textContourMask(canny_contours, cannyContourAreas, [imageData['left'][i] for i in filteredImageData], [imageData['top'][i] for i in filteredImageData], (nrow, ncol))
+        del imageData
+        startTime = timeStage(result, "contour masking", startTime)
         
-        #error handling
-        try:
-            # initialize variables for exporting table data to excel file
-            excelInput = [] # list that holds values to be entered into excel file
-            amendmentRow = [] # list that holds values in a particular row of the ammendments table
-            prevWordIndex = 0 # value of the previous index
-            
-            letterWidth = ((extractedTableData['width'][filteredTableData[1]]/len(extractedTableData['text'][filteredTableData[1]])) + 30) # Defines value to be used to determine if word is nearby if on the same row
+        if progressiveOcr:
+            #the table regions the cheap page words missed are checked at full resolution
+            escalateTableRegions(imgGrayscale, finalMask, canny_contours, cannyContourAreas, sELength2, result)
+            result["ocrSeconds"] += time.perf_counter() - startTime
+            startTime = timeStage(result, "region escalation", startTime)
+    
+    if geometry is not None:
+        saveGeometry(geometry, imgThreshInv, finalMask, contours, contourAreas)
+    
+    # Extracting Image from Original Image Using Mask
+    extractedTable = cv2.bitwise_and(imgGrayscale, finalMask)
+    borderContours = [c for c, area in zip(contours, contourAreas) if area > nrow * ncol * 0.5]
+    croppedDrawingImage = cropDrawing(imgGrayscale, imgThreshInv, finalMask, borderContours, result, memoryBudget)
+    del finalMask, imgThreshInv #freed before the cropped drawing is copied, their buffers were reused by the crop in the low-memory mode
+    croppedDrawingImage = addDrawingBorder(croppedDrawingImage)
+    startTime = timeStage(result, "drawing crop", startTime)
+    
+    #Part 2 - Extracting the Table Data
+    if ocrMode == "page": #in region mode, the table data was already recognised with the table regions
+        extractedTableData = recogniseTableImage(extractedTable, sELength2, progressiveOcr, titleLists, result, memoryBudget)
+    
+    addCounts(result, tableWords = countWords(extractedTableData))
+    return croppedDrawingImage, extractedTableData
+
+#Part 2 OCR of the page mode - recognises the words of the table image (the grayscale image with only the table regions of finalMask), used by both the full pipeline and the layout templates so that both recognise the same words.
+#The table image is overwritten with the table lines removed. With a memoryBudget (low-memory mode), the table lines are removed strip by strip
+def recogniseTableImage(extractedTable, sELength2, progressiveOcr, titleLists, result, memoryBudget = None):
+    startTime = ocrStartTime = time.perf_counter()
+    
+    # Removing the table borders/lines from the image containing only the tables. The thresholding reaches half the block size, and the 3 opening iterations up to 6 structuring element lengths
+    tableImageWithoutLines = tiling.applyOperation(extractedTable, extractedTable, lambda image: removeTableLines(image, sELength2), sELength2 * 6 + thresholdBlockSize, memoryBudget)
+    startTime = timeStage(result, "table lines", startTime)
+    
+    # Extracting data from the table with removed borders
+    extractedTableData, escalatedWords = recogniseTableWords(tableImageWithoutLines, progressiveOcr, titleLists)
+    result["ocrSeconds"] += time.perf_counter() - ocrStartTime
+    timeStage(result, "table OCR", startTime)
+    
+    if progressiveOcr:
+        addCounts(result, escalatedWords = escalatedWords)
+    
+    return extractedTableData
+
+#returns the drawing image cropped from the grayscale image: the table regions of finalMask are removed, and the drawing is cropped to its bounding box (saved in result["drawingBox"]) including the borders.
+#The cropped drawing is a view of the image without the tables, see addDrawingBorder. With a memoryBudget (low-memory mode), the borders are drawn and dilated strip by strip, and the parsed images are overwritten, as their buffers are reused in place
+def cropDrawing(imgGrayscale, imgThreshInv, finalMask, borderContours, result, memoryBudget = None):
+    nrow, ncol = imgGrayscale.shape
+    inPlace = memoryBudget is not None
+    
+    # As the threshold image and mask are binary, (NOT threshold AND NOT mask) + mask is the same as NOT threshold OR mask
+    extractedDrawing = cv2.bitwise_not(imgThreshInv, dst = imgThreshInv if inPlace else None)
+    cv2.bitwise_or(extractedDrawing, finalMask, dst = extractedDrawing)
+    
+    #drawing the found contours to obtain the extracted borders outline, made thicker and combined with the extracted drawing
+    sE3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    rows = nrow if memoryBudget is None else tiling.stripRows(ncol, 4, memoryBudget)
+    
+    if borderContours:
+        for y in range(0, nrow, rows):
+            y0, y1 = max(y - 4, 0), min(y + rows + 4, nrow) #4 rows of halo for the 4 dilation iterations
+            extractedBorders = np.zeros((y1 - y0, ncol), dtype=np.uint8)
+            cv2.drawContours(extractedBorders, borderContours, -1, 255, 1, offset = (0, -y0))
+            extractedBorders = cv2.dilate(extractedBorders, sE3, iterations = 4)
             
-            # 2 nested arrays signifying 2 types of fields (1 for the Amendments Table and 1 for ) Title array to segmentize the table contents (need paraphrasing)
-            titles = [
-                    [ # Array containing the main table titles
-                        "TITLE:",
-                        "DRAWING TITLE:",
-                        "DRAWING NUMBER:",
-                        "DRAWING NO:",
-                        "CONTRACTOR:",
-                        "COMPANY:",
-                        "COMPANY NAME:",
-                        "DRAWN:",
-                        "DRAWN BY:",
-                        "CHECKED:",
-                        "CHECKED BY:",
-                        "APPROVED:",
-                        "APPROVED BY:",
-                        "UNIT:",
-                        "PAGE:",
-                        "STATUS:",
-                        "STS:",
-                        "LANG:",
-                        "PROJECT NO:",   
-                        "FONT:",
-                        "CAD NO:",
-                    ],
-                    [ # Array containing the Amendments table titles
-                        "AMENDMENTS",
-                        "REV",
-                        "ISSUE",
-                        "CHANGE(S)",
-                        "CKD",
-                        "DATE",
-                        "BY",
-                    ]                    
-                ]
+            rowsEnd = min(y + rows, nrow)
+            extractedDrawing[y:rowsEnd] = cv2.add(extractedDrawing[y:rowsEnd], extractedBorders[y - y0:rowsEnd - y0])
+    
+    sE_finalMask = cv2.getStructuringElement(cv2.MORPH_RECT, (20, 20))
+    finalMask = tiling.applyOperation(finalMask, finalMask, lambda image: cv2.dilate(image, sE_finalMask), 20, memoryBudget) #to enlarge the mask area to ensure table borders are removed from final drawing image
+    
+    image_withoutTable = cv2.bitwise_or(imgGrayscale, finalMask, dst = imgGrayscale if inPlace else None) #to remove tables from the image, to only extract the drawing
+    cv2.bitwise_not(extractedDrawing, dst = extractedDrawing)
+    x, y, w, h = cv2.boundingRect(extractedDrawing) # Determine the coordinates of the minimum spanning box of the non-zero pixels
+    result["drawingBox"] = [x, y, w, h]
+    
+    return image_withoutTable[y:y+h, x:x+w] # Using the coordinates from before to crop image to only include contents within the minimum spanning box
+
+#returns a copy of the cropped drawing image (see cropDrawing) with a 30pixel white border, for better output appearance
+def addDrawingBorder(croppedDrawingImage):
+    return cv2.copyMakeBorder(croppedDrawingImage, 30, 30, 30, 30, cv2.BORDER_CONSTANT, value=(255,255,255))
+
+#Part 2 - uses the recognised table words to match the titles with their values and the rows of the Amendments table. Raises IndexError when too few words were recognised.
+#The numbers of filtered words and matched titles are added to result["counts"], and the matched titles and their positions to result["titles"], when a result is passed
+def extractTableValues(extractedTableData, titleLists = drawingTitles, result = None):
+    # Filters the raw data without much If checking/restrictions
+    filteredTableData = []
+
+    for i in range(len(extractedTableData['text'])):
+        if int(float(extractedTableData['conf'][i])) > tableWordConfidence: #ensures words fulfils confidence score threshold to ensure accuracy
+            filteredTableData.append(i)
+    
+    addCounts(result, tableWordsFiltered = len(filteredTableData)) #recorded before parsing, as too few words are the usual reason it fails
+    
+    titles = matching.compileTitles(titleLists[0]) #compiled once per process and reused across drawings
+    matchedTitles = set() #positions of the titles that were already matched, as each title is only matched once
+    multiWordTitles = matching.compileTitles(multiWordValueTitles)
+    
+    # initialize variables for exporting table data to excel file
+    excelInput = [] # list that holds values to be entered into excel file
+    
+    letterWidth = ((extractedTableData['width'][filteredTableData[1]]/len(extractedTableData['text'][filteredTableData[1]])) + 30) # Defines value to be used to determine if word is nearby if on the same row
+    
+    #  2 arrays initialised to hold the extracted titles and array index
+    extractedTitles = []
+    extractedIndices = [] 
+    skip = False
+    
+    # First sequence of for loops to extract titles and their coordinates
+    for c in range(0, len(filteredTableData)):
+        if not skip:
+            index = filteredTableData[c]
+            nextIndex = -1
             
-            #  3 arrays initialised to hold the extracted values, titles and array index
-            extractedWords = []
-            extractedTitles = []
-            extractedIndices = [] 
-            skip = False
+            x, y, w, h = (extractedTableData['left'][index], extractedTableData['top'][index], extractedTableData['width'][index], extractedTableData['height'][index]) #obtaining coordinates and details of title
             
-            # First sequence of for loops to extract titles and their coordinates
-            for c in range(0, len(filteredTableData)):
-                if not skip:
-                    index = filteredTableData[c]
-                    nextIndex = -1
-                    
-                    x, y, w, h = (extractedTableData['left'][index], extractedTableData['top'][index], extractedTableData['width'][index], extractedTableData['height'][index]) #obtaining coordinates and details of title
+            currentWord = extractedTableData['text'][index].upper() #capitalising the word
+    
+            if len(currentWord) > 1: #check if word is not blank
+                if c != len(filteredTableData) - 1:
+                    nextIndex = filteredTableData[c + 1]
+                    x1, y1, w1, h1 = (extractedTableData['left'][nextIndex], extractedTableData['top'][nextIndex], extractedTableData['width'][nextIndex], extractedTableData['height'][nextIndex])
                     
-                    currentWord = extractedTableData['text'][index].upper() #capitalising the word
-            
-                    if len(currentWord) > 1: #check if word is not blank
-                        if c != len(filteredTableData) - 1:
-                            nextIndex = filteredTableData[c + 1]
-                            x1, y1, w1, h1 = (extractedTableData['left'][nextIndex], extractedTableData['top'][nextIndex], extractedTableData['width'][nextIndex], extractedTableData['height'][nextIndex])
+                    if (y1 - y <= 5) and (y1 - y >= -5): #checks if word is on the same row
+                        if x1-(x+w) <= letterWidth: # checks if word is nearby based on the letterWidth variable
+                            nextWord = extractedTableData['text'][nextIndex]
+                            currentWord = currentWord + " " + nextWord  #combined to form 1 word
                             
-                            if (y1 - y <= 5) and (y1 - y >= -5): #checks if word is on the same row
-                                if x1-(x+w) <= letterWidth: # checks if word is nearby based on the letterWidth variable
-                                    nextWord = extractedTableData['text'][nextIndex]
-                                    currentWord = currentWord + " " + nextWord  #combined to form 1 word
-                                    
-                                    w = w + w1 + x1 - (x + w)
-                                    
-                                    skip = True
-                        
-                        for title in titles[0]:
-                            if returnSimilarRatio(currentWord, title) >= 0.8: # compare the similarity of the extracted title and actual title before appending it
-                                extractedTitles.append([currentWord, x, y, w, h]) #append the title
-                                extractedIndices.append(index) 
-                                
-                                if skip:
-                                    extractedIndices.append(nextIndex)
-                                
-                                titles[0].remove(title) # title is removed from original array
-                                break
-                        
-                else:
-                    skip = False
-            
-            # Second sequence of for loops extract while combining content/words that should be together but were mistakently identified as 2 separate words
-            filteredTableData = [w for w in filteredTableData if w not in extractedIndices]
-            
-            for c in range(0, len(filteredTableData)):
-                index = filteredTableData[c]
-                
-                x, y, w, h = (extractedTableData['left'][index], extractedTableData['top'][index], extractedTableData['width'][index], extractedTableData['height'][index]) #extracting the current word's coordinates
+                            w = w + w1 + x1 - (x + w)
+                            
+                            skip = True
                 
-                currentWord = extractedTableData['text'][index].upper() # capitalise the word
+                titleIndex = matching.matchTitle(currentWord, titles, exclude = matchedTitles) # compare the similarity of the extracted title and the remaining titles (>= 0.8) before appending it
                 
-                if c == 0:
-                    extractedWords.append([currentWord, x, y, w, h]) # appending current word
+                if titleIndex is not None:
+                    extractedTitles.append([currentWord, x, y, w, h]) #append the title
+                    extractedIndices.append(index) 
+                    
+                    if skip:
+                        extractedIndices.append(nextIndex)
+                    
+                    matchedTitles.add(titleIndex) # title is no longer matched by the following words
                 
-                else:
-                    if ((y - extractedTableData['top'][prevWordIndex]) <= 5) and ((y - extractedTableData['top'][prevWordIndex]) >= -5): #checks if word is on the same row
-                            previousWord = extractedWords[len(extractedWords)-1]
-                            pX, pY, pW, pH = previousWord[1], previousWord[2], previousWord[3], previousWord[4] # extracting previous word's coordinates
-                            if x - (pX + pW) <= (letterWidth): # checks if word is nearby, given it is on the same row
-                                currentWord = previousWord[0] + " " + extractedTableData['text'][index] # combines previous and current word if close together on x-axis
-                                                 
-                                w = w + pW + (x - (pX + pW))
-                                
-                                del extractedWords[-1]
-                                
-                                extractedWords.append([currentWord, pX, pY, w, pH])
-                                
-                            else:
-                                extractedWords.append([currentWord, x, y, w, h])            
-                        
-                    else:
-                        extractedWords.append([currentWord, x, y, w, h])
-                        
-                prevWordIndex = index
+        else:
+            skip = False
+    
+    addCounts(result, matchedTitles = len(extractedTitles))
+    
+    if result is not None: #positions of the matched titles, used to verify layout templates
+        result["titles"] = [[title, int(x), int(y)] for title, x, y, w, h in extractedTitles]
+    
+    # Second sequence extracts while combining content/words that should be together but were mistakently identified as 2 separate words, in a columnar word store
+    extractedIndices = set(extractedIndices)
+    filteredTableData = [w for w in filteredTableData if w not in extractedIndices]
+    
+    extractedWords = layout.mergeRowWords(layout.wordColumns(extractedTableData, filteredTableData), letterWidth)
+    remainingWords = np.ones(len(extractedWords["text"]), dtype=bool) #words that haven't been used as a value yet
+    
+    # Third sequence uses location/coordinate of titles to extract the corresponding value located nearest to the title
+    for i in range(0, len(extractedTitles)):
+        
+        #variables required for data extraction are initialised
+        order = np.flatnonzero(remainingWords) #positions of the remaining words, in their original order
+        x, y = extractedTitles[i][1], extractedTitles[i][2] #Extracts coordinates of current title
+        currentContentIndex = layout.nearestWord(extractedWords, order, x, y) # given title and corresponding value are on the same row (y-axis) and nearby on the x-axis
+        skippedWordIndex = 0
+        extractedWord = ""
+        
+        # if checking statement to ensure extracted titles fulfil threshold similarity ratio (0.8) when compared with the predefined titles
+        if matching.matchTitle(extractedTitles[i][0], multiWordTitles, strict = True) is not None:
+            sameLine = True
+            extractedWord = extractedWords["text"][order[currentContentIndex]]
             
-            # Third sequence of for loops use location/coordinate of titles to extract the corresponding value located nearest to the title
-            for i in range(0, len(extractedTitles)):
-                
-                #variables required for data extraction are initialised
-                currentContentIndex = 0
-                skippedWordIndex = 0
-                extractedWord = ""
-                nearestContent = 1000000 
+            while sameLine:
+                if currentContentIndex == len(order) - 1:
+                    break
                 
-                for j in range(0, len(extractedWords)):
-                    x, y, w, h = extractedTitles[i][1], extractedTitles[i][2], extractedTitles[i][3], extractedTitles[i][4] #Extracts coordinates of current title
-                    
-                    x1, y1, w1, h1 = extractedWords[j][1], extractedWords[j][2], extractedWords[j][3], extractedWords[j][4] #Extracts coordinates of current word
-                    if x1 >= x - 5 and y1 >= y - 5: # given title and corresponding value are on the same row (y-axis) and nearby on the x-axis
-                        distanceDifference = np.sqrt(np.power((x1 - x), 2) + np.power((y1 - y), 2)) #use pythagoras theorem to determine to calculate distance between title and corresponding value
-                        
-                        if distanceDifference < nearestContent:
-                            nearestContent = distanceDifference
-                            currentContentIndex = j
+                current = order[currentContentIndex] # current word
+                currentContentIndex += 1
+                following = order[currentContentIndex] # next remaining word
                 
-                # if checking statement to ensure extracted titles fulfil threshold similarity ratio (0.8) when compared with the predefined titles
-                if returnSimilarRatio(extractedTitles[i][0], "DRAWING NO.:") > 0.8 or returnSimilarRatio(extractedTitles[i][0], "DRAWING NUMBER:") > 0.8 or returnSimilarRatio(extractedTitles[i][0], "PROJECT NO:") > 0.8 or returnSimilarRatio(extractedTitles[i][0], "CAD NO:") > 0.8:
-                    sameLine = True
-                    extractedWord = extractedWords[currentContentIndex][0]
-                    
-                    while sameLine:
-                        if currentContentIndex == len(extractedWords) - 1:
-                            break
+                if abs(extractedWords["top"][following] - extractedWords["top"][current]) <= layout.rowTolerance: #checks if word is on the same row
+                    if extractedWords["left"][following] - (extractedWords["left"][current] + extractedWords["width"][current]) <= letterWidth * 3: # checks if word is nearby, given it is on the same row
+                        extractedWord = extractedWord + " " + extractedWords["text"][following]
+                        skippedWordIndex = skippedWordIndex + 1
                         
-                        x1, y1, w1, h1 = extractedWords[currentContentIndex][1], extractedWords[currentContentIndex][2], extractedWords[currentContentIndex][3], extractedWords[currentContentIndex][4] # extract current word
-                        currentContentIndex += 1
-                        x2, y2, w2, h2 = extractedWords[currentContentIndex][1], extractedWords[currentContentIndex][2], extractedWords[currentContentIndex][3], extractedWords[currentContentIndex][4] # extract next index word
-             
-                        if (y2 - y1 <= 5) and (y2 - y1 >= -5): #checks if word is on the same row
-                            if x2 - (x1 + w1) <= letterWidth * 3: # checks if word is nearby, given it is on the same row
-                                extractedWord = extractedWord + " " + extractedWords[currentContentIndex][0]
-                                skippedWordIndex = skippedWordIndex + 1
-                                
-                        else:
-                            sameLine = False
-            
-                if extractedWord != "": # ensure extracted word is not blank
-                    excelInput.append([extractedTitles[i][0], extractedWord]) # accepts and appends the word
-                    if skippedWordIndex == 0:
-                        del extractedWords[currentContentIndex - 1]
-                    del extractedWords[currentContentIndex - skippedWordIndex:currentContentIndex]
-                    
                 else:
-                    excelInput.append([extractedTitles[i][0], extractedWords[currentContentIndex][0]]) # accepts and appends the word
-                    del extractedWords[currentContentIndex]
+                    sameLine = False
+        
+        if extractedWord != "": # ensure extracted word is not blank
+            excelInput.append([extractedTitles[i][0], extractedWord]) # accepts and appends the word
+            if skippedWordIndex == 0:
+                remainingWords[order[currentContentIndex - 1]] = False
+            remainingWords[order[currentContentIndex - skippedWordIndex:currentContentIndex]] = False
             
-            # Fourth sequence of for loops to process the remaining extracted words, which are from the Amendments table
-            for c in range(0, len(extractedWords)):
-                x, y, w, h = extractedWords[c][1], extractedWords[c][2], extractedWords[c][3], extractedWords[c][4] # extracts coordinates of current word
-                currentWord = extractedWords[c][0] # extracts value of current word
-                
-                if c == 0: # to directly append the first word/title, AMENDMENTS
-                    amendmentRow.append(currentWord) 
-                    prevWordIndex = c
-                    
-                else:
-                    x1, y1, w1, h1 = extractedWords[prevWordIndex][1], extractedWords[prevWordIndex][2], extractedWords[prevWordIndex][3], extractedWords[prevWordIndex][4] # extract coordinates of previous word
-                    if ((y - y1) <= 5) and ((y - y1) >= -5): # checks if word is on the same row
-                        amendmentRow.append(currentWord) # appends identified word to the row of the ammendment table
-                        prevWordIndex = c
-                        
-                        if c == len(extractedWords) - 1:
-                            excelInput.append(amendmentRow) # appends row of the ammendment table to final array used for entering to excel sheet/file
-                            amendmentRow = [] # ammendment row emptied
-                        
-                    else:
-                        excelInput.append(amendmentRow) # appends row of the ammendment table to final array used for entering to excel sheet/file
-                        amendmentRow = [] # ammendment row emptied
-                        amendmentRow.append(currentWord) # current word appended to ammendment row
-                        prevWordIndex = c
+        else:
+            excelInput.append([extractedTitles[i][0], extractedWords["text"][order[currentContentIndex]]]) # accepts and appends the word
+            remainingWords[order[currentContentIndex]] = False
+    
+    # Fourth sequence groups the remaining extracted words, which are from the Amendments table, into rows
+    order = np.flatnonzero(remainingWords)
+    starts, ends = layout.rowRuns(extractedWords["top"][order])
+    
+    for r in range(len(starts)):
+        # the last row is only appended if it has more than 1 word
+        if r < len(starts) - 1 or ends[r] > starts[r]:
+            excelInput.append([extractedWords["text"][k] for k in order[starts[r]:ends[r] + 1]]) # appends row of the ammendment table to final array used for entering to excel sheet/file
+    
+    return excelInput
+
+# Transferring and saving the extracted and matched values to the excel sheet
+def saveTableValues(excelInput, filename, directory = "Results/Drawing Data"):
+    wbook = Workbook(write_only = True) #initialise workbook, rows are streamed to the file instead of kept as cell objects
+    wsheet = wbook.create_sheet()
+    
+    for row in excelInput:
+        wsheet.append(row)
             
-            # Transferring and saving the extracted and matched values to the excel sheet
-            wbook = Workbook() #initialise workbook
-            wsheet = wbook.active #retrieve active work sheet
+    wbook.save(os.path.join(directory, os.path.splitext(filename)[0] + "_drawingInfo.xlsx")) #workbook is saved
+
+#Extracts a drawing with the candidate layout template matching it best, returning the same as extractDrawingAndTable and the table rows, or None if no template passes verification.
+#The table lines of the template's regions are verified against the drawing's, only the template's table regions are OCR'd, and the titles must be matched again at the template's positions. The full-page OCR, line morphology and contour masking are skipped.
+#The table regions are OCR'd the same way as by the full pipeline in the ocrMode (see recogniseTableImage and extractTextRegions), so a drawing gets the same rows with or without its template
+def extractWithTemplate(imgGrayscale, candidates, ocrMode, titleLists, progressiveOcr, result):
+    nrow, ncol = imgGrayscale.shape
+    startTime = time.perf_counter()
+    
+    imgThreshInv = cv2.adaptiveThreshold(imgGrayscale, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, thresholdBlockSize, thresholdConstant)
+    startTime = timeStage(result, "threshold", startTime)
+    
+    boxLines = {} #the candidates often share regions, so the lines of a region are only detected once
+    
+    def candidateLines(box):
+        if box not in boxLines:
+            boxLines[box] = regionLines(imgThreshInv, box)
+        
+        return boxLines[box]
+    
+    template = templates.matchTemplate(candidateLines, candidates)
+    startTime = timeStage(result, "template verification", startTime)
+    
+    if template is None:
+        return None
+    
+    regions = template["regions"]
+    finalMask = np.zeros((nrow, ncol), dtype=np.uint8)
+    cv2.drawContours(finalMask, regions, -1, 255, -1) #every region of the template is a table, even if its words aren't recognised
+    sELength2 = ncol//tableLineKernelDivisor
+    
+    if ocrMode == "region":
+        extractedTableData = extractTextRegions(imgGrayscale, regions, [cv2.contourArea(region) for region in regions], sELength2, progressiveOcr, titleLists, result)[1]
+        result["ocrSeconds"] += time.perf_counter() - startTime
+        timeStage(result, "region OCR", startTime)
+    
+    else:
+        extractedTableData = recogniseTableImage(cv2.bitwise_and(imgGrayscale, finalMask), sELength2, progressiveOcr, titleLists, result)
+    
+    startTime = time.perf_counter()
+    
+    try:
+        excelInput = extractTableValues(extractedTableData, titleLists, result)
+    
+    except (IndexError): #too few table words were recognised
+        return None
+    
+    verified = templates.titlesMatch(result["titles"], template, ncol)
+    startTime = timeStage(result, "title matching", startTime)
+    
+    if not verified:
+        return None
+    
+    croppedDrawingImage = addDrawingBorder(cropDrawing(imgGrayscale, imgThreshInv, finalMask, template["borders"], result))
+    timeStage(result, "drawing crop", startTime)
+    
+    addCounts(result, width = ncol, height = nrow, tableWords = countWords(extractedTableData))
+    result["template"] = template["id"]
+    
+    return croppedDrawingImage, extractedTableData, excelInput
+
+#returns the key of the layout templates that can be used for an image of this size (see templates.templateKey)
+def layoutTemplateKey(shape, ocrMode, titleLists):
+    return templates.templateKey(shape, [ocrMode, OCR_config, pipelineSettings()], titleLists)
+
+#Extracts a drawing with the layout templates learned from drawings of the same size, titles and settings (see extractWithTemplate).
+#returns the cropped drawing image, the table data and the table rows, or None if no template matches, in which case the drawing is extracted by the full pipeline and its template learned with learnLayoutTemplate
+def extractWithTemplates(imgGrayscale, ocrMode, titleLists, result, templateDirectory = templates.templateDirectory, progressiveOcr = False):
+    candidates = templates.candidateTemplates(layoutTemplateKey(imgGrayscale.shape, ocrMode, titleLists), templateDirectory)
+    
+    if not candidates:
+        return None
+    
+    return extractWithTemplate(imgGrayscale, candidates, ocrMode, titleLists, progressiveOcr, result)
+
+#Learns the layout template of a drawing extracted by the full pipeline, from the geometry saved by extractDrawingAndTable and the titles matched by extractTableValues, so the following drawings of the same layout can be extracted with it
+def learnLayoutTemplate(shape, ocrMode, titleLists, geometry, result, templateDirectory = templates.templateDirectory):
+    if templates.learnTemplate(layoutTemplateKey(shape, ocrMode, titleLists), geometry, result["titles"], templateDirectory) is not None:
+        result["template"] = "learned"
+
+#Part 2 with error handling - returns the table rows matched from the table data (see extractTableValues), or None when too few table words were recognised, with the error and failure reason saved in result
+def matchTableValues(extractedTableData, titleLists, result):
+    startTime = time.perf_counter()
+    
+    try:
+        excelInput = extractTableValues(extractedTableData, titleLists, result)
+    
+    except (IndexError) as error: #too few table words were recognised to locate the titles and values
+        result["error"] = "table data could not be parsed: " + repr(error)
+        result["failure"] = "table not parsed"
+        return None
+    
+    timeStage(result, "title matching", startTime)
+    return excelInput
+
+#Extracts a decoded grayscale drawing with a layout template learned from an earlier drawing when useTemplates is set (see extractWithTemplates), otherwise with the full pipeline, learning the drawing's template.
+#returns the cropped drawing image, the table data and the table rows, which are None when the table data could not be parsed (see matchTableValues)
+def extractImage(imgGrayscale, ocrMode, titleLists, lowMemory, memoryBudget, useTemplates, templateDirectory, progressiveOcr, result):
+    extracted = extractWithTemplates(imgGrayscale, ocrMode, titleLists, result, templateDirectory, progressiveOcr) if useTemplates else None
+    
+    if extracted is not None:
+        return extracted
+    
+    shape = imgGrayscale.shape
+    geometry = {} if useTemplates else None
+    croppedDrawingImage, extractedTableData = extractDrawingAndTable(imgGrayscale, ocrMode, result, lowMemory, memoryBudget, geometry, progressiveOcr, titleLists)
+    excelInput = matchTableValues(extractedTableData, titleLists, result)
+    
+    if excelInput is not None and useTemplates:
+        learnLayoutTemplate(shape, ocrMode, titleLists, geometry, result, templateDirectory)
+    
+    return croppedDrawingImage, extractedTableData, excelInput
+
+#Extracts a single engineering drawing in memory, without reading or writing any files. The image is either the bytes of an encoded image file or a BGR/grayscale image array
+#returns the cropped drawing image and the table rows (the matched [title, value] pairs followed by the Amendments table rows, as saved to the spreadsheet) in "drawing" and "fields", which are None when the extraction fails
+def extract(image, ocrMode = "page", titleLists = drawingTitles, lowMemory = False, memoryBudget = tiling.tileMemoryBudget, useTemplates = False, templateDirectory = templates.templateDirectory, progressiveOcr = False):
+    result = {"success": False, "error": None, "failure": None, "ocrMode": ocrMode, "ocrSeconds": 0.0, "stageSeconds": {}, "drawing": None, "fields": None}
+    
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        imgGrayscale = ingestion.decodeGrayscale(image)
+    
+    elif image.ndim == 3:
+        imgGrayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    else:
+        imgGrayscale = image.copy() if lowMemory else image #copied, as the low-memory mode reuses the buffer of the image
+    
+    if imgGrayscale is None:
+        result["error"] = "image could not be read"
+        result["failure"] = "unreadable image"
+        return result
+    
+    result["drawing"], extractedTableData, result["fields"] = extractImage(imgGrayscale, ocrMode, titleLists, lowMemory, memoryBudget, useTemplates, templateDirectory, progressiveOcr, result)
+    result["success"] = result["fields"] is not None
+    return result
+
+#Extracts the drawing image and table data of a single engineering drawing, returning the per-file outcome instead of silently dropping failures
+#When returnRows is set, the table rows are returned in the result (for an output sink) instead of saved to a spreadsheet per drawing.
+#Results of unchanged drawings are reused from the cache when useCache is set: the recognised words and drawing image are keyed by the image bytes and pipelineSettings, and the matched values additionally by the title lists, so only the matching and export are re-run when the title lists change.
+#When useTemplates is set, drawings matching a layout template learned from an earlier drawing are extracted with it (see extractWithTemplate), and the templates of the other drawings are learned.
+#When progressiveOcr is set, the page and tables are OCR'd downscaled first and only the weak table words are OCR'd again at full resolution (see recogniseTableWords).
+#The drawing is read from the file, or from one of its pages when page is set (see ingestion.listPages), unless its imageBytes and/or decoded imgGrayscale were already read (e.g. prefetched by ingestion.prefetch)
+def processDrawing(filename, directory = drawingsDirectory, ocrMode = "page", useCache = False, titleLists = drawingTitles, lowMemory = False, memoryBudget = tiling.tileMemoryBudget, returnRows = False, useTemplates = False, templateDirectory = templates.templateDirectory, progressiveOcr = False, page = None, imageBytes = None, imgGrayscale = None):
+    name = ingestion.pageName(filename, page) #the results and outputs of multi-page files are named after the page
+    stem = os.path.splitext(name)[0]
+    result = {"filename": name, "success": False, "error": None, "failure": None, "ocrMode": ocrMode, "ocrSeconds": 0.0, "stageSeconds": {}, "cached": None}
+    drawingPath = "Results/Drawings/" + stem + "_drawing.png"
+    drawingDataPath = "Results/Drawing Data/" + stem + "_drawingInfo.xlsx"
+    
+    if page is not None and imgGrayscale is None:
+        imgGrayscale = ingestion.readPage(os.path.join(directory, filename), page) #only this page of the file is decoded
+    
+    elif imageBytes is None and imgGrayscale is None:
+        try:
+            with open(os.path.join(directory, filename), "rb") as imageFile:
+                imageBytes = imageFile.read()
+        
+        except OSError:
+            pass
+    
+    if imageBytes is None and imgGrayscale is None:
+        result["error"] = "image could not be read"
+        result["failure"] = "unreadable image"
+        return result
+    
+    stageResult = None
+    excelInput = None
+    
+    if useCache:
+        variants = (["templates"] if useTemplates else []) + (["progressive", progressiveOcrSettings(), titleLists] if progressiveOcr else []) #templates only OCR the table regions, and the escalated words depend on the titles
+        ocrKey = cache.makeKey(imgGrayscale.tobytes() if imageBytes is None else imageBytes, ocrMode, pipelineSettings(), *variants) #the pages of multi-page files are identified by their pixels
+        valuesKey = cache.makeKey(ocrKey, titleLists)
+        exportKey = cache.makeKey(os.path.abspath(drawingPath))
+        
+        #skips the drawing if its current outputs were exported from the same image and settings (sinks always need the rows)
+        if not returnRows and cache.load("exports", exportKey) == valuesKey and os.path.exists(drawingPath) and os.path.exists(drawingDataPath):
+            print("SKIPPED: Image '" + stem + "' and its settings are unchanged.")
+            result["success"] = True
+            result["cached"] = "exports"
+            return result
+        
+        stageResult = cache.load("ocr", ocrKey)
+        excelInput = cache.load("values", valuesKey)
+    
+    if stageResult is None:
+        if imgGrayscale is None:
+            imgGrayscale = ingestion.decodeGrayscale(imageBytes) # decoded directly to grayscale
+        
+        if imgGrayscale is None: #image could not be decoded
+            result["error"] = "image could not be read"
+            result["failure"] = "unreadable image"
+            return result
+        
+        croppedDrawingImage, extractedTableData, excelInput = extractImage(imgGrayscale, ocrMode, titleLists, lowMemory, memoryBudget, useTemplates, templateDirectory, progressiveOcr, result)
+        
+        if useCache:
+            cache.store("ocr", ocrKey, {"drawing": cv2.imencode(".png", croppedDrawingImage)[1].tobytes(), "tableData": extractedTableData})
             
-            for r in range(0, len(excelInput)):
-                for c in range(0, len(excelInput[r])):
-                    excelVal = excelInput[r][c]
-                    wsheet.cell(r + 1, c + 1).value = excelVal #because excel index starts from 1 onwards (A1:), whereas python uses zero-based indexing
-                    
-            wbook.save("Results/Drawing Data/" + filename[:-4] + "_drawingInfo.xlsx") #workbook is saved
+            if excelInput is not None:
+                cache.store("values", valuesKey, excelInput)
+    
+    else:
+        croppedDrawingImage = cv2.imdecode(np.frombuffer(stageResult["drawing"], dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        extractedTableData = stageResult["tableData"]
+        result["cached"] = "values" if excelInput is not None else "ocr"
+        
+        if excelInput is None: #only the matching is re-run, e.g. when the title lists changed
+            excelInput = matchTableValues(extractedTableData, titleLists, result)
+            
+            if useCache and excelInput is not None:
+                cache.store("values", valuesKey, excelInput)
+    
+    startTime = time.perf_counter()
+    cv2.imwrite(drawingPath, croppedDrawingImage) # Exporting and saving the cropped drawing image
+    startTime = timeStage(result, "export", startTime)
+    
+    if excelInput is None: #the table data could not be parsed
+        print("ERROR: Image '" + stem + "' could NOT be extracted.")
+        return result
+    
+    if returnRows:
+        result["rows"] = excelInput
+    
+    else:
+        saveTableValues(excelInput, name)
+        timeStage(result, "export", startTime)
+    
+    if useCache and not returnRows:
+        cache.store("exports", exportKey, valuesKey)
+    
+    print("SUCCESS: Image '" + stem + "' has been successfully extracted.")
+    result["success"] = True
+    
+    return result
+
+#Adds the command line options of the extraction shared by extraction.py, batch.py, service.py and benchmark.py to the parser: the title vocabulary, the low-memory mode, progressive OCR and the layout templates.
+#The help of --low-memory and --progressive-ocr can be replaced where they only apply to some modes
+def addExtractionArguments(parser, lowMemoryHelp = "processes the morphology in strips and reuses image buffers, for large-format scans", progressiveOcrHelp = "OCRs the page and tables downscaled first and only OCRs the weak table words again at full resolution"):
+    parser.add_argument("--titles", default = None, help = "JSON file with the title vocabulary to match, e.g. {\"titles\": [...], \"amendmentTitles\": [...]}")
+    parser.add_argument("--low-memory", action = "store_true", help = lowMemoryHelp)
+    parser.add_argument("--memory-budget", type = float, default = tiling.tileMemoryBudget / (1024 * 1024), help = "memory (in MB) that the strips of the low-memory mode may use")
+    parser.add_argument("--progressive-ocr", action = "store_true", help = progressiveOcrHelp)
+    parser.add_argument("--templates", action = "store_true", help = "learns the layout of extracted drawings and extracts later drawings with the same layout by only OCRing their table regions")
+    parser.add_argument("--template-directory", default = templates.templateDirectory, help = "directory the learned layout templates are saved to, shared by the workers and later runs")
+
+#returns the extraction options parsed from the shared command line options (see addExtractionArguments), as the keyword arguments of processDrawing and extract
+def extractionOptions(args):
+    titleLists = drawingTitles if args.titles is None else matching.loadTitles(args.titles, drawingTitles)
+    
+    return {"titleLists": titleLists, "lowMemory": args.low_memory, "memoryBudget": int(args.memory_budget * 1024 * 1024), "progressiveOcr": args.progressive_ocr, "useTemplates": args.templates, "templateDirectory": args.template_directory}
+
+#Adds the command line options of a run over many drawings shared by extraction.py and batch.py to the parser: the cache and its eviction (see evictCache), the output sink and the instrumentation
+def addRunArguments(parser):
+    parser.add_argument("--cache", action = "store_true", help = "reuses the cached results of unchanged drawings and settings")
+    parser.add_argument("--cache-max-size", type = float, default = None, help = "evicts the least recently used cache entries above this size (in MB)")
+    parser.add_argument("--cache-max-age", type = float, default = None, help = "evicts cache entries not used for this many days")
+    parser.add_argument("--output", default = "xlsx", choices = sinks.sinkFormats, help = "'xlsx' saves a spreadsheet per drawing, the other formats append every drawing to a single file")
+    parser.add_argument("--output-path", default = None, help = "path of the single output file (defaults to Results/drawingData.<format>)")
+    parser.add_argument("--metrics", default = None, help = "path of a file to record the per-drawing stage times, counts and failure reasons to")
+    parser.add_argument("--metrics-format", default = "jsonl", choices = instrumentation.instrumentationFormats, help = "'jsonl' records a line per drawing, 'prometheus' writes the aggregated metrics as a Prometheus text file")
+    parser.add_argument("--profile-slow", type = float, default = None, help = "profiles every drawing with cProfile and saves the profiles of drawings taking at least this many seconds")
+    parser.add_argument("--profile-directory", default = instrumentation.profileDirectory, help = "directory the profiles of slow drawings are saved to")
+
+#evicts the cache entries above --cache-max-size or not used for --cache-max-age (see addRunArguments), when either is set
+def evictCache(args):
+    if args.cache_max_size is not None or args.cache_max_age is not None:
+        cache.evict(None if args.cache_max_size is None else args.cache_max_size * 1024 * 1024, None if args.cache_max_age is None else args.cache_max_age * 86400)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Extracts the drawing image and table data of engineering drawings.")
+    parser.add_argument("--ocr-mode", default = "page", choices = ocrModes, help = "'page' OCRs the whole sheet and then the table, 'region' only OCRs the candidate table regions")
+    addExtractionArguments(parser)
+    addRunArguments(parser)
+    parser.add_argument("--prefetch", type = int, default = ingestion.prefetchPages, help = "number of pages read and decoded ahead of the drawing being processed")
+    args = parser.parse_args()
+    
+    options = extractionOptions(args)
+    
+    createResultDirectories()
+    sink = sinks.openSink(args.output, args.output_path) #None when saving a spreadsheet per drawing
+    recorder = instrumentation.openRecorder(args.metrics, args.metrics_format) #None when instrumentation is disabled
+    
+    #every page of the image files in the sample engineering images directory, read and decoded lazily by a background thread while the previous drawings are processed.
+    #With the cache, single-page files are only read, and decoded by processDrawing when their results aren't cached
+    pages = ingestion.prefetch(ingestion.readPages(ingestion.listImages(drawingsDirectory), drawingsDirectory, not args.cache), args.prefetch)
+    
+    try:
+        for filename, page, imageBytes, imgGrayscale in pages:
+            startTime = time.perf_counter()
+            result = instrumentation.profiled(ingestion.pageName(filename, page), args.profile_slow, args.profile_directory, processDrawing, filename, ocrMode = args.ocr_mode, useCache = args.cache, returnRows = sink is not None, page = page, imageBytes = imageBytes, imgGrayscale = imgGrayscale, **options)
+            result["seconds"] = time.perf_counter() - startTime
             
-            print("SUCCESS: Image '" + filename[:-4] + "' has been successfully extracted.")
+            if recorder is not None:
+                recorder.record(result)
             
-        except (IndexError):
-            pass
+            if sink is not None and result["success"]:
+                sink.write(result["filename"], result["rows"]) #written by the sink's background thread
+    
+    finally:
+        if sink is not None:
+            sink.close()
+        
+        if recorder is not None:
+            recorder.close()
+    
+    evictCache(args)
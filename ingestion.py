@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+
+import numpy as np
+import cv2
+
+imageExtensions = [".png", ".tif", ".tiff", ".jpg", ".jpeg", ".bmp"] #image files that are ingested
+multiPageExtensions = [".tif", ".tiff"] #image files that can hold several pages
+prefetchPages = 2 #maximum number of decoded pages waiting to be processed
+
+#checks if a file is an image that can be ingested
+def isImageFile(filename):
+    return os.path.splitext(filename)[1].lower() in imageExtensions
+
+#returns the image files of a directory, sorted
+def listImages(directory):
+    return sorted(filename for filename in os.listdir(directory) if isImageFile(filename))
+
+#returns the number of pages of an image file, only reading the headers of multi-page files
+def countPages(path):
+    if os.path.splitext(path)[1].lower() not in multiPageExtensions:
+        return 1
+
+    try:
+        return max(cv2.imcount(path), 1)
+
+    except cv2.error: #unreadable file, reported when its page is read
+        return 1
+
+#returns the name of a page of an image file, used for its results and outputs: the filename itself, or "<name>_page<n><extension>" for the pages of a multi-page file (page is None for single-page files)
+def pageName(filename, page = None):
+    if page is None:
+        return filename
+
+    name, extension = os.path.splitext(filename)
+    return name + "_page" + str(page + 1) + extension
+
+#Lists the pages of the image files lazily, yielding (filename, page) pairs, where page is None for single-page files and the page index of multi-page files.
+#Only the headers of a file are read when its pages are listed
+def listPages(filenames, directory):
+    for filename in filenames:
+        pages = countPages(os.path.join(directory, filename))
+
+        if pages == 1:
+            yield filename, None
+
+        else:
+            for page in range(pages):
+                yield filename, page
+
+#returns the grayscale image of an encoded image file (bytes), decoded directly to grayscale without a colour image, or None if it can't be decoded
+def decodeGrayscale(imageBytes):
+    return cv2.imdecode(np.frombuffer(imageBytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+#returns the grayscale image of a page of an image file (the file itself for page None), decoded directly to grayscale without a colour image, or None if it can't be read.
+#Only the requested page of a multi-page file is decoded
+def readPage(path, page = None):
+    if page is None:
+        return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+
+    try:
+        success, images = cv2.imreadmulti(path, start = page, count = 1, flags = cv2.IMREAD_GRAYSCALE)
+
+    except cv2.error:
+        return None
+
+    return images[0] if success and images else None
+
+#Reads the pages of the image files lazily, yielding (filename, page, imageBytes, imgGrayscale) for each page, where imgGrayscale is None when the page can't be read.
+#The bytes of single-page files are returned as well (to identify cached results), and are None for the pages of multi-page files, which are read one page at a time.
+#Without decode (e.g. when cached drawings may be skipped), single-page files are not decoded and imgGrayscale is None, so they are only decoded by the consumer when needed.
+#A page is only decoded when the next one is requested, so at most one page is held by the generator whatever the size of the files
+def readPages(filenames, directory, decode = True):
+    for filename, page in listPages(filenames, directory):
+        path = os.path.join(directory, filename)
+
+        if page is not None:
+            yield filename, page, None, readPage(path, page)
+            continue
+
+        try:
+            with open(path, "rb") as imageFile:
+                imageBytes = imageFile.read()
+
+        except OSError:
+            yield filename, page, None, None
+            continue
+
+        yield filename, page, imageBytes, decodeGrayscale(imageBytes) if decode else None
+
+#Iterates over items (e.g. the pages of readPages) produced by a background thread, so reading and decoding the next pages overlaps with processing the current one.
+#At most pages items wait in a bounded queue, so that at most pages + 2 items (queued, being produced and being processed) are held at once. Errors of the producer are raised by the iteration, and pages 0 disables the prefetching
+def prefetch(items, pages = prefetchPages):
+    if pages < 1: #no prefetching, each item is produced when it's requested
+        yield from items
+        return
+
+    pending = queue.Queue(maxsize = pages)
+    finished = object() #queued after the last item
+    stopped = threading.Event() #set when the iteration is abandoned, so the producer doesn't block forever
+
+    #queues an item unless the iteration was abandoned, returning False if it was
+    def put(item, error = None):
+        while not stopped.is_set():
+            try:
+                pending.put((item, error), timeout = 0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+
+            put(finished)
+
+        except Exception as error:
+            put(finished, error)
+
+    thread = threading.Thread(target = produce, daemon = True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = pending.get()
+
+            if error is not None:
+                raise error
+
+            if item is finished:
+                break
+
+            yield item
+
+    finally:
+        stopped.set()
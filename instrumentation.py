@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import cProfile
+
+instrumentationFormats = ["jsonl", "prometheus"]
+metricPrefix = "drawing_extraction_" #prefix of the Prometheus metric names
+secondsBuckets = [0.5, 1, 2, 5, 10, 30, 60, 120] #upper bounds of the drawing time histogram
+prometheusInterval = 10 #seconds between rewrites of the Prometheus text file during a run
+profileDirectory = "Results/Profiles" #directory the profiles of slow drawings are saved to
+
+#Records a span per drawing from the results of processDrawing (time per stage, image size, contour and word counts, and the failure reason) to a JSON-lines file, or aggregates them into a Prometheus text file (for the node exporter's textfile collector).
+#Only the results are recorded, so the extraction itself does no extra work, and nothing is done when instrumentation is disabled (no Recorder)
+class Recorder:
+    def __init__(self, path, outputFormat = "jsonl"):
+        if outputFormat not in instrumentationFormats:
+            raise ValueError("Unknown instrumentation format '" + outputFormat + "'")
+
+        self.path = path
+        self.outputFormat = outputFormat
+        self.file = None
+        self.drawings = {}
+        self.stageSeconds = {}
+        self.counts = {}
+        self.buckets = [0] * len(secondsBuckets)
+        self.totalSeconds = 0.0
+        self.ocrSeconds = 0.0
+        self.written = 0.0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        if outputFormat == "jsonl":
+            self.file = open(path, "a", encoding = "utf-8")
+
+    #records the result of a drawing
+    def record(self, result):
+        if self.file is not None:
+            span = {key: result.get(key) for key in ("filename", "success", "failure", "error", "ocrMode", "cached", "seconds", "ocrSeconds", "stageSeconds", "counts", "profile")}
+            span["time"] = time.time()
+            self.file.write(json.dumps(span) + "\n")
+            self.file.flush()
+            return
+
+        status = ("success", "") if result["success"] else ("failure", result.get("failure") or "unknown")
+        self.drawings[status] = self.drawings.get(status, 0) + 1
+        seconds = result.get("seconds", 0.0)
+        self.totalSeconds += seconds
+        self.ocrSeconds += result.get("ocrSeconds", 0.0)
+
+        for i, bound in enumerate(secondsBuckets):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+        for stage, stageSeconds in (result.get("stageSeconds") or {}).items():
+            self.stageSeconds[stage] = self.stageSeconds.get(stage, 0.0) + stageSeconds
+
+        counts = dict(result.get("counts") or {})
+
+        if "width" in counts:
+            counts["pixels"] = counts.pop("width") * counts.pop("height")
+
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+        if time.time() - self.written > prometheusInterval:
+            self.writePrometheus()
+
+    #rewrites the Prometheus text file with the metrics recorded so far, replaced in one step so the collector never reads a partial file
+    def writePrometheus(self):
+        drawings = sum(self.drawings.values())
+        lines = ["# HELP " + metricPrefix + "drawings_total Drawings processed, by status and failure reason.", "# TYPE " + metricPrefix + "drawings_total counter"]
+        lines += [metricPrefix + 'drawings_total{status="' + status + '",reason="' + reason + '"} ' + str(count) for (status, reason), count in sorted(self.drawings.items())]
+
+        lines += ["# HELP " + metricPrefix + "stage_seconds_total Time spent in each stage of the pipeline.", "# TYPE " + metricPrefix + "stage_seconds_total counter"]
+        lines += [metricPrefix + 'stage_seconds_total{stage="' + stage + '"} ' + repr(seconds) for stage, seconds in sorted(self.stageSeconds.items())]
+
+        lines += ["# HELP " + metricPrefix + "items_total Image pixels, contours and words counted by the pipeline.", "# TYPE " + metricPrefix + "items_total counter"]
+        lines += [metricPrefix + 'items_total{item="' + name + '"} ' + str(count) for name, count in sorted(self.counts.items())]
+
+        lines += ["# HELP " + metricPrefix + "ocr_seconds_total Time spent in OCR.", "# TYPE " + metricPrefix + "ocr_seconds_total counter", metricPrefix + "ocr_seconds_total " + repr(self.ocrSeconds)]
+
+        lines += ["# HELP " + metricPrefix + "drawing_seconds Time taken by each drawing.", "# TYPE " + metricPrefix + "drawing_seconds histogram"]
+        lines += [metricPrefix + 'drawing_seconds_bucket{le="' + str(bound) + '"} ' + str(count) for bound, count in zip(secondsBuckets, self.buckets)]
+        lines += [metricPrefix + 'drawing_seconds_bucket{le="+Inf"} ' + str(drawings), metricPrefix + "drawing_seconds_sum " + repr(self.totalSeconds), metricPrefix + "drawing_seconds_count " + str(drawings)]
+
+        temporaryPath = self.path + "." + str(os.getpid()) + ".tmp"
+        with open(temporaryPath, "w", encoding = "utf-8") as metricsFile:
+            metricsFile.write("\n".join(lines) + "\n")
+
+        os.replace(temporaryPath, self.path)
+        self.written = time.time()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+        else:
+            self.writePrometheus()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+#returns a new recorder writing to path, or None when path isn't set (instrumentation disabled)
+def openRecorder(path = None, outputFormat = "jsonl"):
+    if path is None:
+        return None
+
+    return Recorder(path, outputFormat)
+
+#Runs function (which returns a result dict, e.g. processDrawing) under cProfile when profileSlow is set, and saves the profile of drawings that took at least profileSlow seconds to profileDirectory as "<filename>.prof" (viewable with pstats or snakeviz).
+#cProfile only measures Python calls, so the overhead on the OpenCV and Tesseract stages is small. The path of the saved profile is added to result["profile"]
+def profiled(filename, profileSlow, profileDirectory, function, *args, **kwargs):
+    if profileSlow is None:
+        return function(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    startTime = time.perf_counter()
+    result = profiler.runcall(function, *args, **kwargs)
+
+    if time.perf_counter() - startTime >= profileSlow:
+        os.makedirs(profileDirectory, exist_ok = True)
+        result["profile"] = os.path.join(profileDirectory, os.path.splitext(filename)[0] + ".prof")
+        profiler.dump_stats(result["profile"])
+
+    return result
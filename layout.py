@@ -0,0 +1,63 @@
+import numpy as np
+
+rowTolerance = 5 #words with tops within this many pixels of each other are on the same row
+nearbyTolerance = 5 #a value may start up to this many pixels left of/above its title
+
+#Builds a columnar word store from OCR data for the parsed word indices (in order): the text as a list and the coordinates as NumPy arrays
+def wordColumns(data, indices):
+    indices = np.asarray(indices, dtype=np.intp)
+
+    return {
+        "text": [data['text'][i] for i in indices],
+        "left": np.asarray(data['left'], dtype=np.int64)[indices],
+        "top": np.asarray(data['top'], dtype=np.int64)[indices],
+        "width": np.asarray(data['width'], dtype=np.int64)[indices],
+        "height": np.asarray(data['height'], dtype=np.int64)[indices],
+    }
+
+#returns a boolean array marking the words on the same row as, and close enough (within maxGap pixels) to the right of the previous word
+def continuesPrevious(words, maxGap):
+    left, top = words["left"], words["top"]
+    right = left + words["width"]
+    continues = np.zeros(len(left), dtype=bool)
+
+    continues[1:] = (np.abs(top[1:] - top[:-1]) <= rowTolerance) & (left[1:] - right[:-1] <= maxGap)
+    return continues
+
+#returns the start and end (inclusive) positions of the runs of consecutive words (given by their tops) that are on the same row
+def rowRuns(top):
+    starts = np.flatnonzero(np.concatenate(([True], np.abs(np.diff(top)) > rowTolerance)))[:len(top)]
+    ends = np.append(starts[1:], len(top))[:len(starts)] - 1
+
+    return starts, ends
+
+#Combines the words that were mistakenly recognised as separate words, i.e. each word on the same row as and within letterWidth of the previous word, in one vectorised pass.
+#The combined word keeps the capitalised first word, the position and height of the first word, and spans to the end of the last word
+def mergeRowWords(words, letterWidth):
+    count = len(words["text"])
+    starts = np.flatnonzero(~continuesPrevious(words, letterWidth))
+    ends = np.append(starts[1:], count)[:len(starts)] - 1
+
+    right = words["left"] + words["width"]
+    text = [" ".join([words["text"][start].upper()] + words["text"][start + 1:end + 1]) for start, end in zip(starts, ends)]
+
+    return {
+        "text": text,
+        "left": words["left"][starts],
+        "top": words["top"][starts],
+        "width": right[ends] - words["left"][starts],
+        "height": words["height"][starts],
+    }
+
+#returns the position (within order) of the word nearest to the title at (x, y), only considering words to the right of and below the title (within nearbyTolerance). Ties go to the first word, and 0 is returned when no word qualifies
+def nearestWord(words, order, x, y, maxDistance = 1000000):
+    left = words["left"][order]
+    top = words["top"][order]
+
+    distances = np.sqrt((left - x) ** 2 + (top - y) ** 2)
+    qualifies = (left >= x - nearbyTolerance) & (top >= y - nearbyTolerance) & (distances < maxDistance)
+
+    if not qualifies.any():
+        return 0
+
+    return int(np.argmin(np.where(qualifies, distances, np.inf)))
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import http.client
+
+import numpy as np
+
+import extraction
+import ingestion
+
+#HTTP connection over a Unix socket, for services started with --unix
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout = None):
+        super().__init__("localhost", timeout = timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+#returns a new connection to the service
+def connect(host, port, unixPath = None, timeout = 600):
+    if unixPath:
+        return UnixHTTPConnection(unixPath, timeout)
+
+    return http.client.HTTPConnection(host, port, timeout = timeout)
+
+#Sends the images to the service from concurrency client threads (each with its own persistent connection) until requests have been sent, cycling through the images.
+#returns the status, latency (seconds) and success of every request
+def runLoad(images, requests, concurrency, host = "127.0.0.1", port = 8080, unixPath = None, ocrMode = None):
+    target = "/extract" + ("?ocr_mode=" + ocrMode if ocrMode else "")
+    samples = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        connection = connect(host, port, unixPath)
+
+        while True:
+            with lock:
+                i = next(counter, None)
+
+            if i is None:
+                break
+
+            startTime = time.perf_counter()
+
+            try:
+                connection.request("POST", target, body = images[i % len(images)], headers = {"Content-Type": "application/octet-stream"})
+                response = connection.getresponse()
+                payload = json.loads(response.read())
+                sample = (response.status, time.perf_counter() - startTime, response.status == 200 and payload["success"])
+
+            except (OSError, http.client.HTTPException, ValueError): #the connection is reopened for the next request
+                connection.close()
+                connection = connect(host, port, unixPath)
+                sample = (None, time.perf_counter() - startTime, False)
+
+            with lock:
+                samples.append(sample)
+
+        connection.close()
+
+    threads = [threading.Thread(target = client) for i in range(concurrency)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return samples
+
+#returns the latency percentiles (in milliseconds) and counts of the requests
+def summarise(samples, elapsedTime):
+    latencies = np.array([seconds for status, seconds, success in samples if status == 200]) * 1000
+
+    return {
+        "requests": len(samples),
+        "completed": len(latencies),
+        "succeeded": sum(success for status, seconds, success in samples),
+        "rejected": sum(status == 503 for status, seconds, success in samples),
+        "errors": sum(status not in (200, 503) for status, seconds, success in samples),
+        "p50Ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p99Ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "meanMs": float(latencies.mean()) if len(latencies) else None,
+        "seconds": elapsedTime,
+        "requestsPerSecond": len(latencies) / max(elapsedTime, 1e-9),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Load tests the extraction service with the sample engineering drawings and reports the p50/p99 latency.")
+    parser.add_argument("directory", nargs = "?", default = extraction.drawingsDirectory, help = "directory containing the engineering drawing images")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address of the service")
+    parser.add_argument("--port", type = int, default = 8080, help = "port of the service")
+    parser.add_argument("--unix", default = None, help = "connects to the service on this Unix socket path instead of host and port")
+    parser.add_argument("-n", "--requests", type = int, default = 100, help = "total number of requests to send")
+    parser.add_argument("-c", "--concurrency", type = int, default = 4, help = "number of concurrent clients")
+    parser.add_argument("--ocr-mode", default = None, choices = extraction.ocrModes, help = "OCR mode requested (defaults to the service's)")
+    parser.add_argument("-r", "--report", default = None, help = "optional path of a JSON file to save the summary to")
+    args = parser.parse_args()
+
+    images = []
+
+    for filename in ingestion.listImages(args.directory):
+        with open(os.path.join(args.directory, filename), "rb") as imageFile:
+            images.append(imageFile.read())
+
+    startTime = time.perf_counter()
+    samples = runLoad(images, args.requests, args.concurrency, args.host, args.port, args.unix, args.ocr_mode)
+    summary = summarise(samples, time.perf_counter() - startTime)
+
+    print(str(summary["completed"]) + "/" + str(summary["requests"]) + " requests completed (" + str(summary["succeeded"]) + " extracted, " + str(summary["rejected"]) + " rejected with 503, " + str(summary["errors"]) + " errors) in " + format(summary["seconds"], ".2f") + "s, " + format(summary["requestsPerSecond"], ".2f") + " requests/s")
+
+    if summary["completed"]:
+        print("Latency: p50 " + format(summary["p50Ms"], ".1f") + "ms, p99 " + format(summary["p99Ms"], ".1f") + "ms, mean " + format(summary["meanMs"], ".1f") + "ms")
+
+    if args.report:
+        with open(args.report, "w") as reportFile:
+            json.dump(summary, reportFile, indent = 4)
+
+    sys.exit(0 if summary["completed"] else 1)
@@ -0,0 +1,79 @@
+import json
+from collections import Counter
+from difflib import SequenceMatcher
+
+similarityThreshold = 0.8 #minimum similarity ratio for an extracted word to be accepted as a title
+maxScores = 200000 #maximum number of memoized similarity ratios kept by a process
+
+#Similarity ratios of (word, title) pairs, memoized across drawings processed by this process
+scores = {}
+
+#Compiled title vocabularies, keyed by their titles, so each vocabulary is only compiled once per process
+vocabularies = {}
+
+#returns the similarity ratio between a word and a title (the same as SequenceMatcher(None, word, title).ratio()), memoized across drawings
+def similarity(word, title):
+    key = (word, title)
+
+    if key not in scores:
+        if len(scores) >= maxScores:
+            scores.clear()
+
+        scores[key] = SequenceMatcher(None, word, title).ratio()
+
+    return scores[key]
+
+#Compiles a title vocabulary once: the length and character counts of each title, which give upper bounds of the similarity ratio used to reject most words without running SequenceMatcher
+def compileTitles(titles):
+    key = tuple(titles)
+
+    if key not in vocabularies:
+        vocabularies[key] = [{"title": title, "length": len(title), "counts": Counter(title)} for title in titles]
+
+    return vocabularies[key]
+
+#checks if a similarity ratio (or its upper bound) passes the threshold, with > when strict and >= otherwise
+def passes(ratio, threshold, strict):
+    return ratio > threshold if strict else ratio >= threshold
+
+#returns the ratio 2 * matches / total used by SequenceMatcher
+def calculateRatio(matches, total):
+    return 2.0 * matches / total if total else 1.0
+
+#returns the index of the first title in the compiled vocabulary (skipping the indices in exclude) with a similarity ratio to the word passing the threshold, or None.
+#This is the same title as comparing the word with every title in order, but titles are rejected early when the ratio can't pass based on the lengths (the ratio is at most 2 * shorter length / total length)
+#or the shared characters (the ratio is at most 2 * shared characters / total length), the same bounds as SequenceMatcher's real_quick_ratio and quick_ratio
+def matchTitle(word, vocabulary, threshold = similarityThreshold, strict = False, exclude = ()):
+    wordCounts = None
+
+    for i, entry in enumerate(vocabulary):
+        if i in exclude:
+            continue
+
+        total = len(word) + entry["length"]
+
+        if not passes(calculateRatio(min(len(word), entry["length"]), total), threshold, strict):
+            continue
+
+        if wordCounts is None:
+            wordCounts = Counter(word)
+
+        if not passes(calculateRatio(sum((wordCounts & entry["counts"]).values()), total), threshold, strict):
+            continue
+
+        if passes(similarity(word, entry["title"]), threshold, strict):
+            return i
+
+    return None
+
+#Loads user-supplied title lists from a JSON file, e.g. {"titles": ["TITLE:", "DRAWN BY:"], "amendmentTitles": ["REV", "DATE"]}. Lists that aren't in the file are taken from defaultTitleLists
+def loadTitles(path, defaultTitleLists):
+    with open(path, encoding = "utf-8") as titlesFile:
+        titles = json.load(titlesFile)
+
+    titleLists = [list(titles.get("titles", defaultTitleLists[0])), list(titles.get("amendmentTitles", defaultTitleLists[1]))]
+
+    if not all(isinstance(title, str) for titleList in titleLists for title in titleList):
+        raise ValueError("The titles in '" + path + "' must be strings")
+
+    return titleLists
@@ -0,0 +1,124 @@
+import os
+import shlex
+
+import numpy as np
+import pytesseract as pyt
+from pytesseract import Output
+
+#tesserocr binds directly to the Tesseract C++ API. It is optional, pytesseract is used as the fallback when it isn't installed
+try:
+    import tesserocr
+
+except ImportError:
+    tesserocr = None
+
+#Columns of Tesseract's TSV output, in the same order as the keys of pytesseract's Output.DICT
+dataColumns = ["level", "page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height", "conf", "text"]
+
+#Backend used for OCR, "auto" uses tesserocr when available. Can also be selected with the OCR_BACKEND environment variable
+backend = os.environ.get("OCR_BACKEND", "auto")
+
+#Warm Tesseract API instances of this process, keyed by their language, engine mode and page segmentation mode
+engines = {}
+
+#selects the OCR backend used by imageToData, either "auto", "tesserocr" or "pytesseract"
+def setBackend(name):
+    global backend
+
+    if name not in ("auto", "tesserocr", "pytesseract"):
+        raise ValueError("Unknown OCR backend '" + name + "'")
+
+    if name == "tesserocr" and tesserocr is None:
+        raise ValueError("The tesserocr backend was selected but tesserocr is not installed")
+
+    backend = name
+
+#returns the name of the backend that imageToData will use
+def activeBackend():
+    if backend == "auto":
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+
+    return backend
+
+#splits a tesseract command line configuration (e.g. '--oem 3 --psm 6 -c key=value') into its engine mode, page segmentation mode and variables
+def parseConfig(config):
+    oem, psm, variables = 3, 3, {} #tesseract's command line defaults
+    tokens = shlex.split(config)
+
+    for i in range(len(tokens) - 1):
+        if tokens[i] == "--oem":
+            oem = int(tokens[i + 1])
+
+        elif tokens[i] == "--psm":
+            psm = int(tokens[i + 1])
+
+        elif tokens[i] == "-c":
+            key, value = tokens[i + 1].split("=", 1)
+            variables[key] = value
+
+    return oem, psm, variables
+
+#returns the warm Tesseract API instance for the configuration, creating it (and loading the traineddata) only the first time
+def getEngine(config, lang):
+    oem, psm, variables = parseConfig(config)
+    key = (lang, oem, psm, tuple(sorted(variables.items())))
+
+    if key not in engines:
+        engine = tesserocr.PyTessBaseAPI(lang = lang, oem = oem, psm = psm)
+
+        for name, value in variables.items():
+            engine.SetVariable(name, value)
+
+        engines[key] = engine
+
+    return engines[key]
+
+#converts the TSV text returned by the Tesseract API to the same dictionary structure returned by pytesseract's Output.DICT
+def tsvToDict(tsv):
+    data = {column: [] for column in dataColumns}
+
+    for line in tsv.splitlines():
+        values = line.split("\t")
+
+        if len(values) < len(dataColumns) - 1: #skips incomplete lines
+            continue
+
+        if len(values) == len(dataColumns) - 1: #lines without any recognised text
+            values.append("")
+
+        for column, value in zip(dataColumns[:-2], values[:-2]):
+            data[column].append(int(value))
+
+        data["conf"].append(float(values[-2]))
+        data["text"].append(values[-1])
+
+    return data
+
+#runs OCR with the warm Tesseract API instance, passing the NumPy buffer directly instead of writing a temporary image file.
+#The instance is reset first, including the adaptive classifier it trains on every recognised page, so the words of an image are the same as from a fresh tesseract process whatever was OCR'd before
+def tesserocrImageToData(image, config, lang):
+    engine = getEngine(config, lang)
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    bytesPerPixel = 1 if image.ndim == 2 else image.shape[2]
+
+    engine.Clear()
+    engine.ClearAdaptiveClassifier()
+    engine.SetImageBytes(image.tobytes(), width, height, bytesPerPixel, image.strides[0])
+    engine.Recognize()
+
+    return tsvToDict(engine.GetTSVText(0))
+
+#returns the version of Tesseract used by the selected backend (e.g. "5.3.0"), recorded with the outputs that depend on it such as the golden outputs
+def tesseractVersion():
+    if activeBackend() == "tesserocr":
+        return tesserocr.tesseract_version().split()[1] #"tesseract 5.3.0\n leptonica-..."
+
+    return str(pyt.get_tesseract_version())
+
+#extracts the word data (left, top, width, height, conf, text, ...) from an image with the selected OCR backend
+def imageToData(image, config, lang = "eng"):
+    if activeBackend() == "tesserocr":
+        return tesserocrImageToData(image, config, lang)
+
+    return pyt.image_to_data(image, lang = lang, output_type = Output.DICT, config = config)
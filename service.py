@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+
+import batch #before ocr, so the OpenMP thread limits are set before tesserocr is loaded
+import ocr
+import extraction
+
+queueSize = 16 #maximum number of jobs waiting for a worker, further requests are rejected with 503 until the queue drains
+maxBatch = 1 #maximum number of waiting jobs sent to a worker at once, batching only helps throughput when every worker is busy and adds the batch's other jobs to each job's latency
+maxImageBytes = 64 * 1024 * 1024 #largest accepted image upload
+retryAfter = 1 #seconds a rejected client is asked to wait before retrying
+
+statusReasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+#Prepares a service worker like a batch worker, and also loads the Tesseract API instance up front so the first request doesn't pay for it
+def initServiceWorker(ocrBackend = "auto"):
+    batch.initWorker(ocrBackend)
+
+    if ocr.activeBackend() == "tesserocr":
+        ocr.getEngine(extraction.OCR_config, "eng")
+
+#returns the id of the worker process, used to start every worker before the service accepts requests
+def warmWorker():
+    return os.getpid()
+
+#Runs a batch of jobs (image bytes and extract options) inside a worker. The cropped drawing is returned PNG encoded, which is smaller to send back than the image array
+def extractJobs(jobs):
+    responses = []
+
+    for imageBytes, options in jobs:
+        startTime = time.perf_counter()
+
+        try:
+            result = extraction.extract(imageBytes, **options)
+
+        except Exception as error:
+            result = {"success": False, "error": repr(error), "drawing": None, "fields": None}
+
+        if result["drawing"] is not None:
+            result["drawing"] = base64.b64encode(cv2.imencode(".png", result["drawing"])[1].tobytes()).decode("ascii")
+
+        result["seconds"] = time.perf_counter() - startTime
+        responses.append(result)
+
+    return responses
+
+#reads an HTTP request from the stream, returning its method, target, headers and body, or None when the client closed the connection
+async def readRequest(reader):
+    requestLine = await reader.readline()
+
+    if not requestLine.strip():
+        return None
+
+    method, target, version = requestLine.decode("latin-1").split(None, 2)
+    headers = {}
+
+    while True:
+        line = await reader.readline()
+
+        if line in (b"\r\n", b"\n", b""):
+            break
+
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+
+    if length > maxImageBytes:
+        return method, target, headers, None
+
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+#writes a JSON HTTP response to the stream
+def writeResponse(writer, status, payload, keepAlive = True, extraHeaders = ()):
+    body = json.dumps(payload).encode()
+    headers = ["HTTP/1.1 " + str(status) + " " + statusReasons[status], "Content-Type: application/json", "Content-Length: " + str(len(body)), "Connection: " + ("keep-alive" if keepAlive else "close")]
+
+    writer.write(("\r\n".join(headers + list(extraHeaders)) + "\r\n\r\n").encode("latin-1") + body)
+
+#Serves the extraction over HTTP, on host and port or on a Unix socket when unixPath is set, until it's interrupted.
+#  POST /extract with the image file as the body returns the cropped drawing (base64 PNG) and the table fields. The OCR mode can be chosen with ?ocr_mode=page|region
+#  GET /health returns the number of workers and queued jobs
+#Jobs are put on a bounded queue, and requests arriving while it's full are rejected straight away with 503 and Retry-After (backpressure) instead of piling up.
+#One dispatcher per worker takes the next job and runs it in a warm worker process. When no other dispatcher is idle, it also takes up to maxBatch - 1 other jobs already waiting
+async def serve(host = "127.0.0.1", port = 8080, unixPath = None, workers = None, ocrBackend = "auto", queueSize = queueSize, maxBatch = maxBatch, **options):
+    workers = workers or os.cpu_count()
+    loop = asyncio.get_running_loop()
+    jobQueue = asyncio.Queue(maxsize = queueSize)
+    idle = 0 #dispatchers waiting for a job
+
+    async def dispatch(pool):
+        nonlocal idle
+
+        while True:
+            idle += 1
+
+            try:
+                jobs = [await jobQueue.get()]
+
+            finally:
+                idle -= 1
+
+            while len(jobs) < maxBatch and idle == 0 and not jobQueue.empty(): #an idle dispatcher would run the waiting jobs sooner
+                jobs.append(jobQueue.get_nowait())
+
+            try:
+                responses = await loop.run_in_executor(pool, extractJobs, [(imageBytes, jobOptions) for imageBytes, jobOptions, future in jobs])
+
+            except Exception as error: #e.g. a worker process died
+                responses = [{"success": False, "error": repr(error), "drawing": None, "fields": None}] * len(jobs)
+
+            for (imageBytes, jobOptions, future), response in zip(jobs, responses):
+                if not future.done(): #the client may have disconnected
+                    future.set_result(response)
+
+    async def handleRequest(method, target, body):
+        url = urlsplit(target)
+
+        if url.path == "/health":
+            return 200, {"workers": workers, "queued": jobQueue.qsize(), "queueSize": queueSize}, ()
+
+        if url.path != "/extract":
+            return 404, {"error": "unknown path '" + url.path + "'"}, ()
+
+        if method != "POST":
+            return 405, {"error": "images must be sent with POST"}, ()
+
+        if body is None:
+            return 413, {"error": "images are limited to " + str(maxImageBytes) + " bytes"}, ()
+
+        if not body:
+            return 400, {"error": "the request has no image"}, ()
+
+        jobOptions = dict(options)
+        ocrMode = parse_qs(url.query).get("ocr_mode", [jobOptions.get("ocrMode", "page")])[0]
+
+        if ocrMode not in extraction.ocrModes:
+            return 400, {"error": "unknown OCR mode '" + ocrMode + "'"}, ()
+
+        jobOptions["ocrMode"] = ocrMode
+        future = loop.create_future()
+
+        try:
+            jobQueue.put_nowait((body, jobOptions, future))
+
+        except asyncio.QueueFull:
+            return 503, {"error": "the extraction queue is full"}, ("Retry-After: " + str(retryAfter),)
+
+        return 200, await future, ()
+
+    async def handleConnection(reader, writer):
+        try:
+            while True:
+                request = await readRequest(reader)
+
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                status, payload, extraHeaders = await handleRequest(method, target, body)
+                keepAlive = headers.get("connection", "").lower() != "close" and body is not None #oversized bodies aren't read, so the connection can't be reused
+
+                writeResponse(writer, status, payload, keepAlive, extraHeaders)
+                await writer.drain()
+
+                if not keepAlive:
+                    break
+
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError): #disconnected client or malformed request
+            pass
+
+        finally:
+            writer.close()
+
+    with ProcessPoolExecutor(max_workers = workers, initializer = initServiceWorker, initargs = (ocrBackend,)) as pool:
+        await asyncio.gather(*[loop.run_in_executor(pool, warmWorker) for i in range(workers)]) #workers are started before accepting requests
+        dispatchers = [asyncio.create_task(dispatch(pool)) for i in range(workers)]
+
+        if unixPath:
+            server = await asyncio.start_unix_server(handleConnection, path = unixPath)
+            print("Serving on " + unixPath + " with " + str(workers) + " workers")
+
+        else:
+            server = await asyncio.start_server(handleConnection, host, port)
+            print("Serving on http://" + host + ":" + str(port) + " with " + str(workers) + " workers")
+
+        try:
+            async with server:
+                await server.serve_forever()
+
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Serves the extraction of engineering drawings over HTTP with a pool of warm worker processes.")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address to listen on")
+    parser.add_argument("--port", type = int, default = 8080, help = "port to listen on")
+    parser.add_argument("--unix", default = None, help = "listens on this Unix socket path instead of host and port")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (defaults to the number of cores)")
+    parser.add_argument("--queue-size", type = int, default = queueSize, help = "maximum number of waiting jobs before requests are rejected with 503")
+    parser.add_argument("--max-batch", type = int, default = maxBatch, help = "maximum number of waiting jobs sent to a worker at once when every worker is busy")
+    parser.add_argument("--ocr-backend", default = ocr.backend, choices = ["auto", "tesserocr", "pytesseract"], help = "OCR backend, 'auto' uses tesserocr when installed and pytesseract otherwise")
+    parser.add_argument("--ocr-mode", default = "page", choices = extraction.ocrModes, help = "default OCR mode, can be overridden per request with ?ocr_mode=")
+    extraction.addExtractionArguments(parser)
+    args = parser.parse_args()
+
+    options = extraction.extractionOptions(args)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.ocr_backend, args.queue_size, args.max_batch, ocrMode = args.ocr_mode, **options))
+
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,174 @@
+import os
+import csv
+import json
+import time
+import queue
+import threading
+
+from openpyxl import Workbook
+
+#pyarrow is only needed by the Parquet sink. It is optional, the other sinks work without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+except ImportError:
+    pa = pq = None
+
+#Output formats of the table rows: "xlsx" saves a spreadsheet per drawing (see extraction.saveTableValues), the others append every drawing to a single output of the batch
+sinkFormats = ["xlsx", "jsonl", "csv", "parquet", "workbook"]
+
+#default paths of the single-output formats
+defaultPaths = {
+    "jsonl": "Results/drawingData.jsonl",
+    "csv": "Results/drawingData.csv",
+    "parquet": "Results/drawingData.parquet",
+    "workbook": "Results/drawingData.xlsx",
+}
+
+batchSize = 64 #maximum number of drawings written at once
+maxPending = 1024 #maximum number of drawings waiting to be written, write() blocks when more are pending
+
+#Base class of the sinks. write() only queues the drawing's rows, they are written in batches by a background thread so a slow disk doesn't stall the extraction.
+#Subclasses implement openOutput, writeBatch (a list of (filename, rows) pairs, where each row is a list of cells as saved to the spreadsheet) and closeOutput
+class Sink:
+    def __init__(self, path, batchSize = batchSize, maxPending = maxPending):
+        self.path = path
+        self.batchSize = batchSize
+        self.pending = queue.Queue(maxsize = maxPending)
+        self.error = None
+        self.writtenDrawings = 0
+        self.writeSeconds = 0.0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        self.openOutput()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    #queues the table rows of a drawing to be written
+    def write(self, filename, rows):
+        if self.error is not None:
+            raise self.error
+
+        self.pending.put((filename, rows))
+
+    #writes the queued drawings, taking up to batchSize drawings that are already waiting at once, until close() queues None
+    def run(self):
+        closing = False
+
+        while not closing:
+            batch = []
+            item = self.pending.get()
+
+            while item is not None:
+                batch.append(item)
+
+                if len(batch) == self.batchSize:
+                    break
+
+                try:
+                    item = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+
+            closing = item is None
+
+            if batch and self.error is None:
+                startTime = time.perf_counter()
+
+                try:
+                    self.writeBatch(batch)
+
+                except Exception as error: #raised by the next write() or close()
+                    self.error = error
+
+                self.writeSeconds += time.perf_counter() - startTime
+                self.writtenDrawings += len(batch)
+
+    #writes the remaining queued drawings and closes the output
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
+        self.closeOutput()
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+#Appends a JSON object per table row, {"filename": ..., "row": ..., "cells": [...]}, to a JSON-lines file
+class JsonLinesSink(Sink):
+    def openOutput(self):
+        self.file = open(self.path, "a", encoding = "utf-8")
+
+    def writeBatch(self, batch):
+        for filename, rows in batch:
+            for r, cells in enumerate(rows):
+                self.file.write(json.dumps({"filename": filename, "row": r + 1, "cells": cells}) + "\n")
+
+        self.file.flush()
+
+    def closeOutput(self):
+        self.file.close()
+
+#Appends a CSV line per table row: the filename, the row number and then the cells of the row
+class CsvSink(Sink):
+    def openOutput(self):
+        self.file = open(self.path, "a", newline = "", encoding = "utf-8")
+        self.writer = csv.writer(self.file)
+
+    def writeBatch(self, batch):
+        self.writer.writerows([filename, r + 1] + list(cells) for filename, rows in batch for r, cells in enumerate(rows))
+        self.file.flush()
+
+    def closeOutput(self):
+        self.file.close()
+
+#Appends the table rows to a Parquet dataset (a directory of Parquet files) with filename, row and cells columns. Each run adds a new file to the directory, with a row group per batch
+class ParquetSink(Sink):
+    def openOutput(self):
+        if pq is None:
+            raise ValueError("The parquet output format was selected but pyarrow is not installed")
+
+        os.makedirs(self.path, exist_ok = True)
+        self.schema = pa.schema([("filename", pa.string()), ("row", pa.int32()), ("cells", pa.list_(pa.string()))])
+        self.writer = pq.ParquetWriter(os.path.join(self.path, "part-" + time.strftime("%Y%m%d%H%M%S") + "-" + str(os.getpid()) + ".parquet"), self.schema)
+
+    def writeBatch(self, batch):
+        rows = [(filename, r + 1, [str(cell) for cell in cells]) for filename, drawingRows in batch for r, cells in enumerate(drawingRows)]
+        self.writer.write_table(pa.table({"filename": [row[0] for row in rows], "row": [row[1] for row in rows], "cells": [row[2] for row in rows]}, schema = self.schema))
+
+    def closeOutput(self):
+        self.writer.close()
+
+#Streams the table rows of every drawing to a single spreadsheet with openpyxl's write_only mode, a row per table row starting with the filename. The spreadsheet is replaced, as write_only workbooks can't be appended to
+class WorkbookSink(Sink):
+    def openOutput(self):
+        self.workbook = Workbook(write_only = True)
+        self.sheet = self.workbook.create_sheet()
+
+    def writeBatch(self, batch):
+        for filename, rows in batch:
+            for cells in rows:
+                self.sheet.append([filename] + list(cells))
+
+    def closeOutput(self):
+        self.workbook.save(self.path)
+
+sinkClasses = {"jsonl": JsonLinesSink, "csv": CsvSink, "parquet": ParquetSink, "workbook": WorkbookSink}
+
+#returns a new sink of the format writing to path (or the format's default path), or None for the per-drawing "xlsx" format
+def openSink(outputFormat, path = None, batchSize = batchSize):
+    if outputFormat == "xlsx":
+        return None
+
+    if outputFormat not in sinkClasses:
+        raise ValueError("Unknown output format '" + outputFormat + "'")
+
+    return sinkClasses[outputFormat](path or defaultPaths[outputFormat], batchSize)
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import cv2
+
+import cache
+import matching
+
+templateDirectory = "Templates" #directory the learned layout templates are saved to, shared by the workers and later runs
+lineMatchRatio = 0.9 #minimum fraction of the table lines of every region that must match between the template and the drawing, both ways
+lineTolerance = 2 #pixels the table lines of a drawing may be shifted by from the template's
+lineMargin = 32 #pixels around each table region whose lines are verified as well, so a drawing whose table extends past the template's region doesn't match it
+positionTolerance = 0.01 #fraction of the image width the matched titles may be shifted by from the template's
+minTemplateTitles = 2 #minimum number of matched titles to learn a template from, so it can be verified
+shapeStep = 16 #pixels the image size is rounded to in the template key, as scans of the same layout differ by a few pixels
+maxTemplates = 32 #maximum number of templates of an image size that are tried, the most recently learned or loaded ones
+
+#Layout templates learned or loaded by this process, keyed by their id
+templates = {}
+
+#returns the key of the templates that can be used for an image: its (rounded) size and the settings and titles the extraction depends on
+def templateKey(shape, settings, titleLists):
+    return cache.makeKey([round(size / shapeStep) for size in shape], settings, titleLists, lineMargin) #the lines of templates learned with another lineMargin can't be compared
+
+#returns the bounding box (x, y, w, h) of a table region enlarged by lineMargin, in which the table lines of the template are learned and verified
+def linesBox(region):
+    x, y, w, h = cv2.boundingRect(region)
+    return (x - lineMargin, y - lineMargin, w + 2 * lineMargin, h + 2 * lineMargin)
+
+#returns the path of a saved template
+def templatePath(key, templateId, directory = templateDirectory):
+    return os.path.join(directory, key[:16], templateId + ".pkl")
+
+#checks if the table regions are the same as the template's: as many regions, with bounding boxes within lineTolerance pixels of the template's
+def sameRegions(regions, template):
+    boxes = sorted(cv2.boundingRect(region) for region in regions)
+    templateBoxes = sorted(cv2.boundingRect(region) for region in template["regions"])
+
+    return len(boxes) == len(templateBoxes) and all(max(abs(a - b) for a, b in zip(box, templateBox)) <= lineTolerance for box, templateBox in zip(boxes, templateBoxes))
+
+#Learns the layout template of a successfully extracted drawing: the outlines of its table regions with their table lines, its border contours and the positions of its matched titles.
+#The template is saved to directory, so the other workers and later runs can use it. returns the template, or None if too few titles were matched to verify it,
+#or if a template with the same table regions was already learned (e.g. the drawing only failed the titles check of that template), so drawings of one layout don't each add a template
+def learnTemplate(key, geometry, titles, directory = templateDirectory):
+    if len(titles) < minTemplateTitles or not geometry.get("regions"):
+        return None
+
+    if any(sameRegions(geometry["regions"], template) for template in candidateTemplates(key, directory)):
+        return None
+
+    regions = [np.ascontiguousarray(region) for region in geometry["regions"]]
+    templateId = cache.makeKey(b"".join(region.tobytes() for region in regions), titles)
+    lines = [(lineImage.shape, np.packbits(lineImage > 0)) for lineImage in geometry["lines"]] #packed to a bit per pixel
+    template = {"id": templateId, "key": key, "regions": regions, "lines": lines, "borders": [np.ascontiguousarray(border) for border in geometry["borders"]], "titles": titles}
+    templates[templateId] = template
+    cache.writePickle(templatePath(key, templateId, directory), template)
+
+    return template
+
+#returns the templates for the key, including any saved to directory by other workers or runs that this process hasn't loaded yet
+def candidateTemplates(key, directory = templateDirectory):
+    keyDirectory = os.path.dirname(templatePath(key, "", directory))
+
+    try:
+        names = os.listdir(keyDirectory)
+    except OSError:
+        names = []
+
+    for name in names:
+        if name.endswith(".pkl") and name[:-4] not in templates:
+            template = cache.readPickle(os.path.join(keyDirectory, name))
+
+            if template is not None: #not an incomplete template
+                templates[template["id"]] = template
+
+    candidates = [template for template in templates.values() if template["key"] == key]
+    return candidates[-maxTemplates:]
+
+#returns how well the table lines of the drawing match the template's, for the region matching the worst: the fraction of the template's line pixels found in the drawing (within lineTolerance pixels) and of the drawing's found in the template, whichever is lower.
+#regionLines(box) returns the table lines of the drawing in a bounding box (see linesBox). Only the table regions are looked at, so verifying a template is much cheaper than detecting the table lines of the whole image
+def lineScore(regionLines, template):
+    sE = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * lineTolerance + 1, 2 * lineTolerance + 1))
+    score = 1.0
+
+    for region, (shape, packedLines) in zip(template["regions"], template["lines"]):
+        templateLines = np.unpackbits(packedLines, count = shape[0] * shape[1]).reshape(shape) * np.uint8(255)
+        lines = regionLines(linesBox(region))
+
+        templateCount, count = cv2.countNonZero(templateLines), cv2.countNonZero(lines)
+
+        if templateCount == 0 or count == 0:
+            score = min(score, float(templateCount == count))
+            continue
+
+        found = cv2.countNonZero(cv2.bitwise_and(templateLines, cv2.dilate(lines, sE))) / templateCount
+        extra = cv2.countNonZero(cv2.bitwise_and(lines, cv2.dilate(templateLines, sE))) / count
+        score = min(score, found, extra)
+
+    return score
+
+#returns the candidate template whose table lines match the drawing best, or None if none match at least lineMatchRatio
+def matchTemplate(regionLines, candidates):
+    scores = [(lineScore(regionLines, template), i) for i, template in enumerate(candidates)]
+    scores = [(score, i) for score, i in scores if score >= lineMatchRatio]
+
+    return candidates[max(scores)[1]] if scores else None
+
+#checks that every title of the template was matched again, at the same position (within positionTolerance of the image width)
+def titlesMatch(titles, template, width):
+    tolerance = positionTolerance * width
+
+    return all(any(matching.similarity(title, expected) >= matching.similarityThreshold and abs(x - expectedX) <= tolerance and abs(y - expectedY) <= tolerance for title, x, y in titles) for expected, expectedX, expectedY in template["titles"])
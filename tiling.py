@@ -0,0 +1,39 @@
+import numpy as np
+
+tileMemoryBudget = 64 * 1024 * 1024 #default memory (in bytes) that the strips processed at once by a tiled operation may use
+
+#returns the number of rows of each strip, so that the strip (with its halo rows) and the temporary images of the operation (buffers strips in total) fit within the memory budget
+def stripRows(ncol, halo, memoryBudget = tileMemoryBudget, buffers = 6):
+    rows = memoryBudget // (max(ncol, 1) * buffers) - 2 * halo
+
+    return max(rows, halo, 16) #strips at least as tall as the halo are required to process the image in place
+
+#Applies an operation (a function of an image returning an image of the same size, e.g. a morphology operation) to horizontal strips of src and writes the result to dst.
+#Each strip is processed with halo extra rows above and below, which must be at least the number of rows the operation's result depends on, so the result matches applying the operation to the whole image.
+#dst may be src, as each strip is only written back once the next strip (the only strip that could still need its rows) has been processed
+def tiledApply(src, dst, operation, halo, memoryBudget = tileMemoryBudget, buffers = 6):
+    nrow, ncol = src.shape[:2]
+    rows = stripRows(ncol, halo, memoryBudget, buffers)
+    pending = None
+
+    for y in range(0, nrow, rows):
+        y0, y1 = max(y - halo, 0), min(y + rows + halo, nrow)
+        strip = operation(src[y0:y1].copy()) #copied, so the operation only sees the rows of the strip
+
+        if pending is not None:
+            dst[pending[0]:pending[0] + len(pending[1])] = pending[1]
+
+        pending = (y, strip[y - y0:min(y + rows, nrow) - y0])
+
+    if pending is not None:
+        dst[pending[0]:pending[0] + len(pending[1])] = pending[1]
+
+    return dst
+
+#Applies an operation to the whole image when memoryBudget is None, or to strips of it with tiledApply otherwise, so the same code runs in the full-frame and low-memory modes.
+#dst is only used by the strips (dst None allocates a new image), the whole image's result is always a new image
+def applyOperation(src, dst, operation, halo, memoryBudget = None):
+    if memoryBudget is None:
+        return operation(src)
+
+    return tiledApply(src, np.empty_like(src) if dst is None else dst, operation, halo, memoryBudget)